@@ -1,28 +1,194 @@
-import json
+import os
+from functools import partial
 from pathlib import Path
+from urllib.parse import urlencode
+import numpy as np
 import pandas as pd
 from babel.numbers import format_decimal
 
-from dash import Dash, dcc, html, Input, Output, State, no_update, dash_table, ctx
+from dash import (
+    ClientsideFunction,
+    Dash,
+    dcc,
+    html,
+    Input,
+    Output,
+    State,
+    no_update,
+    dash_table,
+    ctx,
+    Patch,
+)
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
-import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+from flask import Response, abort, jsonify, request
+from flask_compress import Compress
 
-from src.utils import get_options_dropdown
+from src.areas import AreasEscolas, CamadaAreas
+from src.cache import CacheMemoria, CacheResultados, criar_cache
+from src.consulta import resolver_consulta
+from src.cubo import normalizar_filtros
+from src.espacial import (
+    ZOOM_INDIVIDUAL,
+    IndiceEspacial,
+    agrupar_escolas,
+    janela_do_relayout,
+)
+from src.exportacao import (
+    COLUNAS_APLICACOES,
+    COLUNAS_ESCOLAS,
+    FORMATOS,
+    em_lotes,
+    exportar,
+    filtros_da_requisicao,
+    fontes_aplicacoes,
+    lotes_aplicacoes,
+    tabela_escolas,
+)
+from src.geometria import GeojsonEstatico
+from src.metricas import MetricasCallbacks, anotar, fase
+from src.municipios import (
+    Municipio,
+    Municipios,
+    Particao,
+    descobrir_municipios,
+    enquadramento,
+)
+from src.pacote import PacoteCliente
+from src.ranking import COLUNAS_RANKING, RankingEscolas
+from src.recarga import DadosAtuais
+from src.utils import array_tipado, get_options_dropdown
 
 
 # data
-DATA_PATH = Path().resolve() / "data"
+DATA_PATH = Path(os.environ.get("PAINEL_DATA_PATH", Path().resolve() / "data"))
 SHP_FOLDER = Path().resolve() / "data" / "shapefiles"
+# vários municípios: uma pasta por município (python -m src.municipios), cada
+# uma carregada no primeiro acesso; sem ela, só DATA_PATH com Osasco
+MUNICIPIOS_PATH = os.environ.get("PAINEL_MUNICIPIOS_PATH")
+# partições mantidas em memória por processo; a menos usada sai primeiro
+MUNICIPIOS_RESIDENTES = int(os.environ.get("PAINEL_MUNICIPIOS_RESIDENTES", "4"))
+
+# modo clientside: mapa, cards e dropdowns calculados no navegador; o pacote é
+# de um único município, então não se aplica ao modo com vários
+MODO_CLIENTE = (
+    os.environ.get("PAINEL_MODO_CLIENTE", "0") == "1" and not MUNICIPIOS_PATH
+)
+# intervalo (s) entre verificações de novos dados de cada município; 0 desliga
+RECARGA_INTERVALO = float(os.environ.get("PAINEL_RECARGA_INTERVALO", "60"))
+# mapa só com os marcadores da área visível, agrupados conforme o zoom; não se
+# aplica ao modo clientside, em que o navegador já tem todos os pontos
+MAPA_VIEWPORT = os.environ.get("PAINEL_MAPA_VIEWPORT", "0") == "1" and not MODO_CLIENTE
+# "Total de alunos" estimado por HyperLogLog em vez dos conjuntos exatos de RA
+ALUNOS_APROXIMADO = os.environ.get("PAINEL_ALUNOS_APROXIMADO", "0") == "1"
+# choropleth de vacinas por aluno em cada área da camada (município, distritos,
+# ...) sob os marcadores; as escolas são atribuídas às áreas uma vez, na carga
+MAPA_AREAS = os.environ.get("PAINEL_MAPA_AREAS", "0") == "1" and not MODO_CLIENTE
+# (com vários municípios, ``areas.geojson`` na pasta de cada um ou o contorno)
+CAMADA_AREAS = Path(
+    os.environ.get("PAINEL_CAMADA_AREAS", SHP_FOLDER / "osasco.geojson")
+)
+# campo de ``properties`` com o nome de cada área
+CAMADA_AREAS_CAMPO = os.environ.get("PAINEL_CAMADA_AREAS_CAMPO", "NM_MUN")
+
+# contorno do município: lido e simplificado uma vez, servido como estático
+# tolerância em graus para o Douglas–Peucker; 0 mantém a geometria original
+GEOJSON_TOLERANCIA = float(os.environ.get("PAINEL_GEOJSON_TOLERANCIA", "0"))
 
-n_vacinas_escola = pd.read_csv(DATA_PATH / "n_vacinas_escola.csv", sep=";")
-n_vacinas_escola = n_vacinas_escola.query(
-    "data_vacinacao_ano >= 2015"
-)  # há apenas poucas vacinas antes disso, parece sujeira
+CENTRO_PADRAO = dict(lat=-23.5324, lon=-46.7916)
+ZOOM_PADRAO = 11
 
-n_alunos = pd.read_csv(DATA_PATH / "n_alunos.csv", sep=";")
 
-anos = sorted(n_vacinas_escola["data_vacinacao_ano"].unique())
-ano_min, ano_max = min(anos), max(anos)
+def preparar_base(base, camada_areas=None):
+    if MODO_CLIENTE:
+        base.extras["pacote_cliente"] = PacoteCliente(base.cubo, base.rotulos)
+    if MAPA_VIEWPORT:
+        base.extras["indice_espacial"] = IndiceEspacial(base.cubo.unidades)
+    if MAPA_AREAS:
+        base.extras["areas"] = AreasEscolas(camada_areas, base.cubo)
+    return base
+
+
+def camada_do_municipio(municipio):
+    if not MUNICIPIOS_PATH:
+        return CAMADA_AREAS
+    areas = municipio.pasta / "areas.geojson"
+    return areas if areas.exists() else municipio.geometria
+
+
+def criar_particao(municipio):
+    """Contorno, enquadramento e dados de um município, montados uma vez."""
+    geojson = GeojsonEstatico(municipio.geometria, GEOJSON_TOLERANCIA)
+    extras = {}
+    camada_areas = None
+    if MAPA_AREAS:
+        caminho = camada_do_municipio(municipio)
+        camada_areas = CamadaAreas(caminho, CAMADA_AREAS_CAMPO)
+        extras["areas_geojson"] = (
+            geojson
+            if caminho.resolve() == municipio.geometria.resolve()
+            else GeojsonEstatico(caminho, GEOJSON_TOLERANCIA)
+        )
+    centro, zoom = municipio.centro, municipio.zoom
+    if centro is None or zoom is None:
+        centro, zoom = enquadramento(geojson.geojson)
+    # snapshot em Arrow (python -m src.etl) quando existir; senão, os CSVs
+    # brutos. Os callbacks sempre leem a versão atual via dados.obter(), que é
+    # trocada pela recarga em segundo plano quando chega um extrato novo
+    dados = DadosAtuais(
+        municipio.pasta,
+        preparar=partial(preparar_base, camada_areas=camada_areas),
+        alunos_aproximado=ALUNOS_APROXIMADO,
+    )
+    return Particao(municipio, dados, geojson, centro, zoom, extras)
+
+
+if MUNICIPIOS_PATH:
+    lista_municipios = descobrir_municipios(Path(MUNICIPIOS_PATH))
+    if not lista_municipios:
+        raise FileNotFoundError(f"nenhum município particionado em {MUNICIPIOS_PATH}")
+else:
+    lista_municipios = [
+        Municipio(
+            codigo="osasco",
+            nome="Osasco",
+            pasta=DATA_PATH,
+            geometria=SHP_FOLDER / "osasco.geojson",
+            centro=CENTRO_PADRAO,
+            zoom=ZOOM_PADRAO,
+        )
+    ]
+municipios = Municipios(lista_municipios, criar_particao, MUNICIPIOS_RESIDENTES)
+MUNICIPIO_PADRAO = os.environ.get(
+    "PAINEL_MUNICIPIO_PADRAO", lista_municipios[0].codigo
+)
+if MUNICIPIO_PADRAO not in municipios:
+    raise ValueError(f"município padrão desconhecido: {MUNICIPIO_PADRAO}")
+VARIOS_MUNICIPIOS = len(lista_municipios) > 1
+# o município padrão é carregado já na importação (antes do fork, com preload)
+municipios.obter(MUNICIPIO_PADRAO)
+
+
+def particao_do_municipio(codigo):
+    # valor do seletor; ausente ou desconhecido (URL antiga) vai para o padrão
+    return municipios.obter(codigo if codigo in municipios else MUNICIPIO_PADRAO)
+
+
+# resultados por estado dos filtros; 0 desliga. Com PAINEL_CACHE_PASTA os
+# workers compartilham o cache em disco em vez de cada um manter o seu
+CACHE_TAMANHO = int(os.environ.get("PAINEL_CACHE_TAMANHO", "256"))
+CACHE_PASTA = os.environ.get("PAINEL_CACHE_PASTA")
+cache_consultas = (
+    criar_cache(CACHE_TAMANHO, CACHE_PASTA) if CACHE_TAMANHO > 0 else None
+)
+# rankings por escola com as ordens já calculadas: trocar de página ou de
+# ordenação reaproveita o mesmo objeto, sempre em memória do processo
+cache_rankings = (
+    CacheResultados(CacheMemoria(CACHE_TAMANHO)) if CACHE_TAMANHO > 0 else None
+)
+TAMANHO_PAGINA_RANKING = 15
 
 imagem_cabecalho = html.Img(
     src="/assets/Marca-Osasco-Digital-COLOR-ALTA-02.svg",
@@ -40,187 +206,398 @@ app = Dash(external_stylesheets=[dbc.themes.SANDSTONE])
 app.title = "Painel de Vacinação"
 server = app.server
 
-app.layout = dbc.Container(
-    [
-        dbc.Row(
-            [
-                dbc.Col(
-                    imagem_cabecalho,
-                    width=12,
-                    # className="d-flex justify-content-center",
-                ),
-            ],
-        ),
-        dbc.Row(
-            [
-                # COLUNA 1: Filtros e alerta
-                dbc.Col(
-                    [
-                        html.Div(
-                            [
-                                dbc.Button(
-                                    "Limpar filtros",
-                                    id="btn-limpar-filtros",
-                                    color="secondary",
-                                    outline=True,
-                                    style={"marginBottom": "1rem", "width": "100%"},
-                                ),
-                                html.Br(),
-                                html.Strong("Selecione o ano:"),
-                                dcc.Dropdown(
-                                    id="dropdown-ano",
-                                    options=[
-                                        {"label": str(ano), "value": ano}
-                                        for ano in anos
-                                    ],
-                                    value=ano_max,
-                                    clearable=False,
-                                    style={"width": "100%"},
-                                ),
-                                html.Br(),
-                                html.Strong("Selecione a modalidade escolar:"),
-                                dcc.Dropdown(
-                                    id="dropdown-modalidade",
-                                    options=[{"label": "Todas", "value": "Todas"}]
-                                    + get_options_dropdown(
-                                        n_vacinas_escola, "modalidade"
-                                    ),
-                                    value="Todas",
-                                    clearable=False,
-                                ),
-                                html.Br(),
-                                html.Strong("Selecione o tipo de unidade escolar:"),
-                                dcc.Dropdown(
-                                    id="dropdown-tp-unidade",
-                                    options=[{"label": "Todas", "value": "Todas"}]
-                                    + get_options_dropdown(
-                                        n_vacinas_escola, "tipo_unidade"
-                                    ),
-                                    value="Todas",
-                                    clearable=False,
-                                ),
-                                html.Br(),
-                                html.Strong("Selecione a escola:"),
-                                dcc.Dropdown(
-                                    id="select-escola-mapa",
-                                    value="Todas",
-                                    searchable=True,
-                                ),
-                                html.Br(),
-                                html.Strong("Selecione a vacina:"),
-                                dcc.Dropdown(
-                                    id="dropdown-vacina-mapa",
-                                    options=[{"label": "Todas", "value": "Todas"}]
-                                    + get_options_dropdown(n_vacinas_escola, "vacina"),
-                                    value="Todas",
-                                ),
-                                html.Br(),
-                            ]
-                        ),
-                    ],
-                    width=3,
-                    style={
-                        "height": "100vh",
-                        "padding": "2rem 1rem",
-                    },
-                ),
-                # COLUNA 2: Mapa
-                dbc.Col(
-                    [dcc.Graph(id="mapa-vacinacao", style={"width": "100%"})],
-                    width=7,
-                    style={"padding": "2rem 1rem"},
-                ),
-                # COLUNA 3: Cards descritivos
-                dbc.Col(
-                    [
-                        html.Div(
-                            id="info-escola-selecionada", style={"marginTop": "2rem"}
-                        ),
-                    ],
-                    width=2,
-                ),
-            ],
-            style={"height": "100vh"},
-        ),
+# respostas dos callbacks serializadas com orjson (numpy sem conversão a listas)
+pio.json.config.default_engine = "orjson"
+# brotli quando o navegador aceita, gzip nos demais; o pacote clientside já sai
+# comprimido e é ignorado. Configurado aqui em vez de Dash(compress=True), que
+# força só gzip
+server.config.update(
+    COMPRESS_ALGORITHM=["br", "gzip"],
+    COMPRESS_MIMETYPES=[
+        "text/html",
+        "text/css",
+        "text/plain",
+        "application/javascript",
+        "application/json",
+        "application/geo+json",
+        "image/svg+xml",
     ],
-    fluid=True,
 )
+Compress(server)
 
 
-def formatar_label(label):
-    preposicoes = {
-        "em", "de", "da", "do", "dos", "das", "a", "e", "para", "por", "com", "sem", "sob", "sobre", "às", "ao", "aos", "as", "no", "na", "nos", "nas"
-    }
-    palavras = label.lower().split()
-    resultado = []
-    for i, palavra in enumerate(palavras):
-        if i == 0 or palavra not in preposicoes:
-            resultado.append(palavra.capitalize())
-        else:
-            resultado.append(palavra)
-    return " ".join(resultado)
+@server.after_request
+def adicionar_etag(resposta):
+    # GETs (página, layout, dependências, GeoJSON, pacote) ganham ETag do
+    # conteúdo e respondem 304 quando o navegador já tem a mesma versão.
+    # Registrado depois do Compress para rodar antes dele: o ETag é do corpo
+    # original e o flask-compress acrescenta o sufixo da codificação
+    if (
+        request.method == "GET"
+        and resposta.status_code == 200
+        and not resposta.is_streamed
+        and not resposta.direct_passthrough
+        and "ETag" not in resposta.headers
+    ):
+        resposta.add_etag()
+        resposta.make_conditional(request)
+    return resposta
 
 
-# CALLBACKS
-# callback para mostrar informações da escola selecionada em um alerta
-@app.callback(
-    Output("info-escola-selecionada", "children"),
-    [
-        Input("select-escola-mapa", "value"),
-        Input("dropdown-tp-unidade", "value"),
-        Input("dropdown-modalidade", "value"),
-        Input("dropdown-ano", "value"),
-        Input("dropdown-vacina-mapa", "value"),
-    ],
+@server.route(f"{app.config.routes_pathname_prefix}geojson/<codigo>/<nome_arquivo>")
+def servir_geojson(codigo, nome_arquivo):
+    if codigo not in municipios:
+        abort(404)
+    particao = municipios.obter(codigo)
+    geojson = next(
+        (
+            geojson
+            for geojson in (particao.geojson, particao.extras.get("areas_geojson"))
+            if geojson is not None and geojson.nome_arquivo == nome_arquivo
+        ),
+        None,
+    )
+    if geojson is None:
+        abort(404)
+    # a URL carrega a versão do conteúdo, então o navegador pode guardar para sempre
+    return Response(
+        geojson.conteudo,
+        mimetype="application/geo+json",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
+
+
+# latência por callback e por fase, servida em /metrics (formato Prometheus);
+# PAINEL_PERFIL_LIMIAR_MS > 0 grava perfis cProfile das chamadas lentas
+metricas = MetricasCallbacks(
+    app,
+    cache=cache_consultas,
+    limiar_perfil=float(os.environ.get("PAINEL_PERFIL_LIMIAR_MS", "0")) / 1000,
+    amostra_perfil=float(os.environ.get("PAINEL_PERFIL_AMOSTRA", "0.05")),
+    pasta_perfil=os.environ.get("PAINEL_PERFIL_PASTA", "perfis"),
+    versoes=lambda: {
+        particao.municipio.codigo: particao.dados.obter().versao
+        for particao in municipios.particoes()
+    },
 )
-def mostrar_info_escola(
-    escola: str,
-    tipo_unidade: str,
-    modalidade: str,
-    ano_selecionado: int,
-    vacina: str,
-):
-    # Filtro para mostrar todos os dados quando dropdown esvaziado (clear value)
-    if escola is None:
-        escola = "Todas"
-    if tipo_unidade is None:
-        tipo_unidade = "Todas"
-    if vacina is None:
-        vacina = "Todas"
-    if modalidade is None:
-        modalidade = "Todas"
-
-    if escola == "Todas":
-        df_escola = n_vacinas_escola
-        df_alunos = n_alunos
+
+
+@server.route(f"{app.config.routes_pathname_prefix}metrics")
+def servir_metricas():
+    return Response(metricas.exportar(), mimetype="text/plain; version=0.0.4")
+
+
+@server.route(f"{app.config.routes_pathname_prefix}cache")
+def estatisticas_cache():
+    # acertos e falhas do processo que atendeu, para dimensionar o cache
+    if cache_consultas is None:
+        abort(404)
+    return jsonify(cache_consultas.estatisticas())
+
+
+EXPORTACOES = {"aplicacoes": COLUNAS_APLICACOES, "escolas": COLUNAS_ESCOLAS}
+LINKS_EXPORTACAO = [
+    ("aplicacoes", "csv", "Aplicações (CSV)"),
+    ("aplicacoes", "parquet", "Aplicações (Parquet)"),
+    ("escolas", "csv", "Por escola (CSV)"),
+    ("escolas", "parquet", "Por escola (Parquet)"),
+]
+
+
+@server.route(f"{app.config.routes_pathname_prefix}exportar/<tabela>.<formato>")
+def exportar_dados(tabela, formato):
+    # mesmos filtros dos callbacks na query string; o corpo é gerado por lotes
+    if tabela not in EXPORTACOES or formato not in FORMATOS:
+        abort(404)
+    try:
+        filtros = filtros_da_requisicao(request.args)
+    except ValueError:
+        abort(400)
+    codigo = request.args.get("municipio", MUNICIPIO_PADRAO)
+    if codigo not in municipios:
+        abort(404)
+    particao = municipios.obter(codigo)
+    if tabela == "aplicacoes":
+        fontes = fontes_aplicacoes(particao.municipio.pasta)
+        if fontes is None:
+            abort(404)
+        lotes = lotes_aplicacoes(fontes, filtros)
     else:
-        df_escola = n_vacinas_escola[n_vacinas_escola["nome_unidade"] == escola]
-        df_alunos = n_alunos[n_alunos["nome_unidade"] == escola]
+        lotes = em_lotes(tabela_escolas(particao.dados.obter().cubo, filtros))
+    return Response(
+        exportar(lotes, EXPORTACOES[tabela], formato),
+        mimetype=FORMATOS[formato],
+        headers={
+            "Content-Disposition": f'attachment; filename="{tabela}.{formato}"',
+            "Cache-Control": "no-store",
+        },
+    )
 
-    if tipo_unidade != "Todas":
-        df_escola = df_escola[df_escola["tipo_unidade"] == tipo_unidade]
-        df_alunos = df_alunos[df_alunos["tipo_unidade"] == tipo_unidade]
 
-    if vacina != "Todas":
-        df_escola = df_escola[df_escola["vacina"] == vacina]
+def url_exportacao(tabela, formato, filtros, municipio=None):
+    parametros = {dim: valor for dim, valor in filtros.items() if valor != "Todas"}
+    if municipio is not None:
+        parametros["municipio"] = municipio
+    consulta = urlencode(parametros)
+    caminho = app.get_relative_path(f"/exportar/{tabela}.{formato}")
+    return f"{caminho}?{consulta}" if consulta else caminho
 
-    if modalidade != "Todas":
-        df_escola = df_escola[df_escola["modalidade"] == modalidade]
 
-    n_vacinas = format_decimal(
-        df_escola[df_escola["data_vacinacao_ano"] == ano_selecionado][
-            "n_vacinas"
-        ].sum(),
-        locale="pt_BR",
+def urls_geojson(particao):
+    # contorno e camada de áreas do município, versionados pelo conteúdo
+    codigo = particao.municipio.codigo
+    contorno = app.get_relative_path(
+        f"/geojson/{codigo}/{particao.geojson.nome_arquivo}"
     )
+    areas = particao.extras.get("areas_geojson")
+    if areas is None:
+        return contorno, None
+    return contorno, app.get_relative_path(f"/geojson/{codigo}/{areas.nome_arquivo}")
+
+
+if MODO_CLIENTE:
+
+    @server.route(f"{app.config.routes_pathname_prefix}dados/<nome_arquivo>")
+    def servir_pacote(nome_arquivo):
+        # páginas abertas antes de uma recarga ainda pedem o pacote anterior
+        dados = municipios.obter(MUNICIPIO_PADRAO).dados
+        pacotes = [
+            base.extras["pacote_cliente"]
+            for base in (dados.obter(), dados.anterior)
+            if base is not None
+        ]
+        pacote_cliente = next(
+            (p for p in pacotes if p.nome_arquivo == nome_arquivo), None
+        )
+        if pacote_cliente is None:
+            abort(404)
+        # corpo já comprimido; o navegador descomprime de forma transparente
+        return Response(
+            pacote_cliente.conteudo,
+            mimetype="application/octet-stream",
+            headers={
+                "Content-Encoding": "gzip",
+                "Cache-Control": "public, max-age=31536000, immutable",
+            },
+        )
+
+TAMANHO_MAXIMO_MARCADOR = 20
+# com o choropleth das áreas, ele é o primeiro trace e os marcadores ficam acima
+INDICE_MARCADORES = 1 if MAPA_AREAS else 0
+# camadas do contorno: linha, mais o preenchimento quando não há choropleth
+N_CAMADAS_CONTORNO = 1 if MAPA_AREAS else 2
+
+
+def montar_mapa_base(particao):
+    # figura criada uma vez no layout; os callbacks só trocam os marcadores
+    # (e o contorno, quando o município muda)
+    geojson_url, areas_url = urls_geojson(particao)
+    mapa_osasco = go.Figure()
+    if MAPA_AREAS:
+        mapa_osasco.add_trace(
+            go.Choroplethmap(
+                geojson=areas_url,
+                featureidkey=f"properties.{CAMADA_AREAS_CAMPO}",
+                locations=[],
+                z=[],
+                customdata=[],
+                colorscale="Blues",
+                marker=dict(opacity=0.5, line=dict(width=1, color="blue")),
+                colorbar=dict(title=dict(text="Vacinas por aluno")),
+                hovertemplate="Área=%{location}<br>"
+                "Número de vacinas=%{customdata[0]}<br>"
+                "Total de alunos=%{customdata[1]}<br>"
+                "Vacinas por aluno=%{z:.2f}<extra></extra>",
+                name="",
+            )
+        )
+    mapa_osasco.add_trace(
+        go.Scattermap(
+            lat=[],
+            lon=[],
+            mode="markers",
+            marker=dict(size=[], sizemode="area", sizeref=1, color="#636efa"),
+            customdata=[],
+            hovertemplate="Número de vacinas=%{customdata[1]}<br>"
+            "Nome da unidade=%{customdata[0]}<extra></extra>",
+            name="",
+            showlegend=False,
+        )
+    )
+    camadas = [
+        dict(
+            sourcetype="geojson",
+            source=geojson_url,
+            type="line",
+            color="blue",
+            line=dict(width=1),
+        ),
+    ]
+    if not MAPA_AREAS:
+        # sem o choropleth, o município é só um preenchimento fixo
+        camadas.insert(
+            0,
+            dict(
+                sourcetype="geojson",
+                source=geojson_url,
+                type="fill",
+                color="rgba(0,0,255,0.2)",
+            ),
+        )
+    mapa_osasco.update_layout(
+        height=600,
+        map=dict(
+            style="outdoors",
+            center=particao.centro,
+            zoom=particao.zoom,
+            layers=camadas,
+        ),
+        margin={"r": 0, "t": 0, "l": 0, "b": 60},
+    )
+    return mapa_osasco
+
+
+def atualizar_mapa(
+    consulta, particao, marcadores=None, reposicionar=True, areas=None
+):
+    escola = consulta.filtros["nome_unidade"]
+    df_escola = consulta.escolas
+    # por padrão, um marcador por escola da consulta
+    marcadores = df_escola if marcadores is None else marcadores
+
+    n_vacinas = marcadores["n_vacinas"].tolist()
+    patch = Patch()
+    patch["data"][INDICE_MARCADORES]["lat"] = array_tipado(marcadores["latitude"])
+    patch["data"][INDICE_MARCADORES]["lon"] = array_tipado(marcadores["longitude"])
+    if "rotulo" in marcadores:
+        # grupos: rótulo no hover e nome vazio para o clique não filtrar
+        patch["data"][INDICE_MARCADORES]["customdata"] = list(
+            zip(marcadores["rotulo"], n_vacinas, marcadores["nome_unidade"])
+        )
+    else:
+        patch["data"][INDICE_MARCADORES]["customdata"] = list(
+            zip(marcadores["nome_unidade"], n_vacinas)
+        )
+    patch["data"][INDICE_MARCADORES]["marker"]["size"] = array_tipado(n_vacinas, "i4")
+    # mesma escala de área do px.scatter_map (size_max=20)
+    patch["data"][INDICE_MARCADORES]["marker"]["sizeref"] = (
+        max(n_vacinas) / TAMANHO_MAXIMO_MARCADOR**2 if n_vacinas else 1
+    )
+    if areas is not None:
+        por_area = areas.agregar(df_escola, consulta.filtros["tipo_unidade"])
+        patch["data"][0]["locations"] = por_area["area"].tolist()
+        patch["data"][0]["z"] = array_tipado(por_area["vacinas_por_aluno"])
+        patch["data"][0]["customdata"] = list(
+            zip(por_area["n_vacinas"].tolist(), por_area["n_alunos"].tolist())
+        )
+    if not reposicionar:
+        return patch
+
+    geojson_url, areas_url = urls_geojson(particao)
+    for indice in range(N_CAMADAS_CONTORNO):
+        patch["layout"]["map"]["layers"][indice]["source"] = geojson_url
+    if areas is not None:
+        patch["data"][0]["geojson"] = areas_url
+
+    # Definir zoom da escola selecionada
+    if escola != "Todas" and not df_escola.empty:
+        lat = df_escola.iloc[0]["latitude"]
+        lon = df_escola.iloc[0]["longitude"]
+        center = dict(lat=lat, lon=lon)
+        zoom = ZOOM_INDIVIDUAL
+    else:
+        center = particao.centro
+        zoom = particao.zoom
+    patch["layout"]["map"]["center"] = center
+    patch["layout"]["map"]["zoom"] = zoom
+    # o enquadramento do usuário só é descartado quando a escola (ou o
+    # município) muda
+    patch["layout"]["map"]["uirevision"] = f"{particao.municipio.codigo}:{escola}"
+    return patch
+
 
-    ind_card_n_alunos = format_decimal(
-        df_alunos["ra"].nunique(),
-        locale="pt_BR",
+def marcadores_visiveis(particao, base, consulta, relayout):
+    """Escolas da janela visível, agrupadas conforme o zoom (``MAPA_VIEWPORT``).
+
+    Só um evento do próprio mapa recorta pela janela: quando os filtros mudam
+    o enquadramento pode ser redefinido (``uirevision``), então todas as
+    escolas são enviadas, agrupadas no zoom que o mapa terá.
+    """
+    escolas = consulta.escolas
+    janela = janela_do_relayout(relayout)
+    if ctx.triggered_id == "mapa-vacinacao":
+        if janela is None:
+            # relayout sem mudança de posição (ex.: autosize)
+            raise PreventUpdate
+        (lat_min, lat_max, lon_min, lon_max), zoom = janela
+        nomes = base.extras["indice_espacial"].na_janela(
+            lat_min, lat_max, lon_min, lon_max
+        )
+        escolas = escolas[escolas["nome_unidade"].isin(nomes)]
+    elif (
+        ctx.triggered_id in (None, "select-escola-mapa", "dropdown-municipio")
+        or janela is None
+    ):
+        selecionada = consulta.filtros["nome_unidade"] != "Todas"
+        zoom = ZOOM_INDIVIDUAL if selecionada else particao.zoom
+    else:
+        zoom = janela[1]
+    return agrupar_escolas(escolas, zoom)
+
+
+OPCOES_TENDENCIA = {
+    "total": "Total",
+    "vacina": "Vacina",
+    "modalidade": "Modalidade",
+    "tipo_unidade": "Tipo de unidade",
+    "nome_unidade": "Escola",
+}
+# séries além destas (pelo total no período) são somadas em "Outras"
+MAXIMO_SERIES_TENDENCIA = 8
+
+
+def montar_tendencia(base, valores, matriz, por, empilhar, ano_selecionado):
+    anos = base.series.anos
+    if len(valores) > MAXIMO_SERIES_TENDENCIA:
+        ordem = np.argsort(-matriz.sum(axis=1), kind="stable")
+        principais = ordem[: MAXIMO_SERIES_TENDENCIA - 1]
+        outras = matriz[ordem[MAXIMO_SERIES_TENDENCIA - 1 :]].sum(axis=0)
+        valores = [valores[i] for i in principais] + ["Outras"]
+        matriz = np.vstack([matriz[principais], outras])
+
+    figura = go.Figure()
+    for valor, serie in zip(valores, matriz):
+        if por is None:
+            nome = "Vacinas aplicadas"
+        elif pd.isna(valor):
+            nome = "Não informado"
+        else:
+            nome = base.rotulos.get(por, {}).get(valor, valor)
+        figura.add_trace(
+            go.Scatter(
+                x=anos,
+                y=serie.tolist(),
+                name=nome,
+                mode="lines+markers",
+                stackgroup="tendencia" if empilhar else None,
+                hovertemplate="%{x}: %{y:,.0f}<extra>%{fullData.name}</extra>",
+            )
+        )
+    if ano_selecionado in anos:
+        figura.add_vline(x=ano_selecionado, line_dash="dot", line_color="gray")
+    figura.update_layout(
+        height=350,
+        separators=",.",
+        margin={"r": 0, "t": 10, "l": 0, "b": 0},
+        xaxis=dict(dtick=1),
+        yaxis=dict(title="Vacinas aplicadas", rangemode="tozero"),
+        showlegend=por is not None,
     )
+    return figura
 
-    media_idade = format_decimal(df_escola["idade"].mean().round(1), locale="pt_BR")
 
+def montar_cards():
+    # estrutura fixa dos cards; os callbacks só preenchem os valores
     cards = [
         dbc.Row(
             [
@@ -242,7 +619,7 @@ def mostrar_info_escola(
                                 dbc.CardBody(
                                     [
                                         html.P(
-                                            ind_card_n_alunos,
+                                            id="card-total-alunos",
                                             style={"fontSize": "1.5rem"},
                                         )
                                     ],
@@ -269,7 +646,12 @@ def mostrar_info_escola(
                                     },
                                 ),
                                 dbc.CardBody(
-                                    [html.P(n_vacinas, style={"fontSize": "1.5rem"})],
+                                    [
+                                        html.P(
+                                            id="card-vacinas-aplicadas",
+                                            style={"fontSize": "1.5rem"},
+                                        )
+                                    ],
                                 ),
                             ],
                             style={
@@ -294,7 +676,12 @@ def mostrar_info_escola(
                                     },
                                 ),
                                 dbc.CardBody(
-                                    [html.P(media_idade, style={"fontSize": "1.5rem"})]
+                                    [
+                                        html.P(
+                                            id="card-media-idade",
+                                            style={"fontSize": "1.5rem"},
+                                        )
+                                    ]
                                 ),
                             ],
                             style={
@@ -311,168 +698,501 @@ def mostrar_info_escola(
             ]
         ),
     ]
-    # RETORNOS
     return html.Div(cards)
 
 
+def montar_layout():
+    # avaliado a cada carregamento de página: anos e opções da versão atual
+    particao = municipios.obter(MUNICIPIO_PADRAO)
+    base = particao.dados.obter()
+    layout = dbc.Container(
+        [
+            dbc.Row(
+                [
+                    dbc.Col(
+                        imagem_cabecalho,
+                        width=12,
+                        # className="d-flex justify-content-center",
+                    ),
+                ],
+            ),
+            dbc.Row(
+                [
+                    # COLUNA 1: Filtros e alerta
+                    dbc.Col(
+                        [
+                            html.Div(
+                                [
+                                    dbc.Button(
+                                        "Limpar filtros",
+                                        id="btn-limpar-filtros",
+                                        color="secondary",
+                                        outline=True,
+                                        style={"marginBottom": "1rem", "width": "100%"},
+                                    ),
+                                    html.Br(),
+                                    # só aparece com mais de um município
+                                    html.Div(
+                                        [
+                                            html.Strong("Selecione o município:"),
+                                            dcc.Dropdown(
+                                                id="dropdown-municipio",
+                                                options=[
+                                                    {
+                                                        "label": municipio.nome,
+                                                        "value": municipio.codigo,
+                                                    }
+                                                    for municipio in lista_municipios
+                                                ],
+                                                value=MUNICIPIO_PADRAO,
+                                                clearable=False,
+                                                style={"width": "100%"},
+                                            ),
+                                            html.Br(),
+                                        ],
+                                        style=(
+                                            None
+                                            if VARIOS_MUNICIPIOS
+                                            else {"display": "none"}
+                                        ),
+                                    ),
+                                    html.Strong("Selecione o ano:"),
+                                    dcc.Dropdown(
+                                        id="dropdown-ano",
+                                        options=[
+                                            {"label": str(ano), "value": ano}
+                                            for ano in base.anos
+                                        ],
+                                        value=base.ano_max,
+                                        clearable=False,
+                                        style={"width": "100%"},
+                                    ),
+                                    html.Br(),
+                                    html.Strong("Selecione a modalidade escolar:"),
+                                    dcc.Dropdown(
+                                        id="dropdown-modalidade",
+                                        options=get_options_dropdown(
+                                            base.indice.valores("modalidade", {}),
+                                            include_all=True,
+                                        ),
+                                        value="Todas",
+                                        clearable=False,
+                                    ),
+                                    html.Br(),
+                                    html.Strong("Selecione o tipo de unidade escolar:"),
+                                    dcc.Dropdown(
+                                        id="dropdown-tp-unidade",
+                                        options=get_options_dropdown(
+                                            base.indice.valores("tipo_unidade", {}),
+                                            include_all=True,
+                                        ),
+                                        value="Todas",
+                                        clearable=False,
+                                    ),
+                                    html.Br(),
+                                    html.Strong("Selecione a escola:"),
+                                    dcc.Dropdown(
+                                        id="select-escola-mapa",
+                                        value="Todas",
+                                        searchable=True,
+                                    ),
+                                    html.Br(),
+                                    html.Strong("Selecione a vacina:"),
+                                    dcc.Dropdown(
+                                        id="dropdown-vacina-mapa",
+                                        options=get_options_dropdown(
+                                            base.indice.valores("vacina", {}),
+                                            include_all=True,
+                                        ),
+                                        value="Todas",
+                                    ),
+                                    html.Br(),
+                                    html.Strong("Exportar dados filtrados:"),
+                                    html.Div(
+                                        [
+                                            html.A(
+                                                rotulo,
+                                                id=f"link-exportar-{tabela}-{formato}",
+                                                download="",
+                                                className="btn btn-outline-primary "
+                                                "btn-sm",
+                                                style={"margin": "0.25rem 0.25rem 0 0"},
+                                            )
+                                            for tabela, formato, rotulo in (
+                                                LINKS_EXPORTACAO
+                                            )
+                                        ]
+                                    ),
+                                ]
+                            ),
+                        ],
+                        width=3,
+                        style={
+                            "height": "100vh",
+                            "padding": "2rem 1rem",
+                        },
+                    ),
+                    # COLUNA 2: Mapa
+                    dbc.Col(
+                        [
+                            dcc.Graph(
+                                id="mapa-vacinacao",
+                                figure=montar_mapa_base(particao),
+                                style={"width": "100%"},
+                            )
+                        ],
+                        width=7,
+                        style={"padding": "2rem 1rem"},
+                    ),
+                    # COLUNA 3: Cards descritivos
+                    dbc.Col(
+                        [
+                            html.Div(
+                                montar_cards(),
+                                id="info-escola-selecionada",
+                                style={"marginTop": "2rem"},
+                            ),
+                        ],
+                        width=2,
+                    ),
+                ],
+                style={"height": "100vh"},
+            ),
+            # LINHA 2: evolução ano a ano com os mesmos filtros
+            dbc.Row(
+                [
+                    dbc.Col(
+                        [
+                            html.Strong("Comparar anos por:"),
+                            dcc.Dropdown(
+                                id="dropdown-tendencia-por",
+                                options=[
+                                    {"label": rotulo, "value": valor}
+                                    for valor, rotulo in OPCOES_TENDENCIA.items()
+                                ],
+                                value="total",
+                                clearable=False,
+                            ),
+                            html.Br(),
+                            dcc.Checklist(
+                                id="check-tendencia-empilhar",
+                                options=[{"label": " Empilhar", "value": "empilhar"}],
+                                value=[],
+                            ),
+                        ],
+                        width=3,
+                        style={"padding": "2rem 1rem"},
+                    ),
+                    dbc.Col(
+                        [dcc.Graph(id="grafico-tendencia", style={"width": "100%"})],
+                        width=9,
+                        style={"padding": "2rem 1rem"},
+                    ),
+                ],
+            ),
+            dbc.Row(
+                [
+                    dbc.Col(
+                        [
+                            html.Strong("Ranking das escolas:"),
+                            # paginação, ordenação e filtro resolvidos no
+                            # servidor; o navegador só recebe a página visível
+                            dash_table.DataTable(
+                                id="tabela-ranking",
+                                columns=[
+                                    {
+                                        "name": rotulo,
+                                        "id": coluna,
+                                        "type": (
+                                            "text"
+                                            if coluna == "nome_unidade"
+                                            else "numeric"
+                                        ),
+                                    }
+                                    for coluna, rotulo in COLUNAS_RANKING.items()
+                                ],
+                                page_current=0,
+                                page_size=TAMANHO_PAGINA_RANKING,
+                                page_action="custom",
+                                sort_action="custom",
+                                sort_mode="single",
+                                sort_by=[
+                                    {"column_id": "n_vacinas", "direction": "desc"}
+                                ],
+                                filter_action="custom",
+                                filter_query="",
+                                filter_options={"case": "insensitive"},
+                                style_cell={"textAlign": "left"},
+                                style_header={
+                                    "backgroundColor": "#e3f2fd",
+                                    "fontWeight": "bold",
+                                },
+                            ),
+                        ],
+                        width=12,
+                        style={"padding": "0 1rem 2rem 1rem"},
+                    ),
+                ],
+            ),
+        ],
+        fluid=True,
+    )
+    if MODO_CLIENTE:
+        pacote_cliente = base.extras["pacote_cliente"]
+        layout.children.append(
+            dcc.Store(
+                id="pacote-cliente",
+                data={
+                    **pacote_cliente.metadados(
+                        app.get_relative_path(f"/dados/{pacote_cliente.nome_arquivo}")
+                    ),
+                    "centro": particao.centro,
+                    "zoom": particao.zoom,
+                    "tamanho_maximo": TAMANHO_MAXIMO_MARCADOR,
+                },
+            )
+        )
+    return layout
+
+
+app.layout = montar_layout
+
+
 @app.callback(
     Output("select-escola-mapa", "value"),
     [
         Input("mapa-vacinacao", "clickData"),
         Input("btn-limpar-filtros", "n_clicks"),
+        Input("dropdown-municipio", "value"),
     ],
     prevent_initial_call=True,
 )
-def selecionar_ou_limpar_escola(clickData, n_clicks):
+def selecionar_ou_limpar_escola(clickData, n_clicks, municipio):
     trigger = ctx.triggered_id
     if trigger == "mapa-vacinacao":
         if clickData and "points" in clickData and len(clickData["points"]) > 0:
             point = clickData["points"][0]
+            if point.get("curveNumber", INDICE_MARCADORES) != INDICE_MARCADORES:
+                # clique numa área do choropleth não seleciona escola
+                return no_update
+            customdata = point.get("customdata") or []
+            # marcadores agrupados trazem o nome da escola na terceira posição,
+            # vazio nos grupos de várias unidades
+            indice_nome = 2 if len(customdata) > 2 else 0
             nome = point.get("hovertext") or (
-                point.get("customdata")[0] if point.get("customdata") else None
+                customdata[indice_nome] if customdata else None
             )
-            return nome
+            return nome or no_update
         return no_update
-    elif trigger == "btn-limpar-filtros":
+    elif trigger in ("btn-limpar-filtros", "dropdown-municipio"):
         return "Todas"
     return no_update
 
 
 @app.callback(
     [
+        Output("dropdown-ano", "options"),
         Output("dropdown-ano", "value"),
         Output("dropdown-modalidade", "value"),
         Output("dropdown-tp-unidade", "value"),
         Output("dropdown-vacina-mapa", "value"),
     ],
-    Input("btn-limpar-filtros", "n_clicks"),
+    [
+        Input("btn-limpar-filtros", "n_clicks"),
+        Input("dropdown-municipio", "value"),
+    ],
     prevent_initial_call=True,
 )
-def limpar_outros_filtros(n_clicks):
-    return ano_max, "Todas", "Todas", "Todas"
+def limpar_outros_filtros(n_clicks, municipio):
+    # trocar de município também recomeça os filtros, com os anos dele
+    base = particao_do_municipio(municipio).dados.obter()
+    anos = [{"label": str(ano), "value": ano} for ano in base.anos]
+    return anos, base.ano_max, "Todas", "Todas", "Todas"
 
 
-@app.callback(
+# CALLBACKS
+# callback único: resolve os filtros uma vez e atualiza mapa, cards e opções
+SAIDAS_PAINEL = [
+    Output("mapa-vacinacao", "figure"),
+    Output("card-total-alunos", "children"),
+    Output("card-vacinas-aplicadas", "children"),
+    Output("card-media-idade", "children"),
     Output("select-escola-mapa", "options"),
-    [
-        Input("dropdown-ano", "value"),
-        Input("dropdown-tp-unidade", "value"),
-        Input("dropdown-modalidade", "value"),
-        Input("dropdown-vacina-mapa", "value"),
-    ],
-)
-def update_escola_options(ano, tipo_unidade, modalidade, vacina):
-    df = n_vacinas_escola.copy()
-    if ano is not None:
-        df = df[df["data_vacinacao_ano"] == ano]
-    if tipo_unidade is not None and tipo_unidade != "Todas":
-        df = df[df["tipo_unidade"] == tipo_unidade]
-    if modalidade is not None and modalidade != "Todas":
-        df = df[df["modalidade"] == modalidade]
-    if vacina is not None and vacina != "Todas":
-        df = df[df["vacina"] == vacina]
-
-    escolas = sorted(df["nome_unidade"].dropna().unique())
-    options = [{"label": "Todas", "value": "Todas"}] + [
-        {"label": formatar_label(e), "value": e} for e in escolas
-    ]
-    return options
+    Output("dropdown-vacina-mapa", "options"),
+    Output("dropdown-modalidade", "options"),
+    Output("dropdown-tp-unidade", "options"),
+]
+ENTRADAS_PAINEL = [
+    Input("dropdown-municipio", "value"),
+    Input("dropdown-tp-unidade", "value"),
+    Input("dropdown-modalidade", "value"),
+    Input("dropdown-ano", "value"),
+    Input("dropdown-vacina-mapa", "value"),
+    Input("select-escola-mapa", "value"),
+]
+if MAPA_VIEWPORT:
+    ENTRADAS_PAINEL.append(Input("mapa-vacinacao", "relayoutData"))
 
 
-@app.callback(
-    Output("dropdown-vacina-mapa", "options"),
-    # Output("dropdown-vacina-mapa", "value"),
-    [
-        Input("dropdown-ano", "value"),
-        Input("dropdown-tp-unidade", "value"),
-        Input("select-escola-mapa", "value"),
-        Input("dropdown-modalidade", "value"),
-    ],
-    # State("dropdown-vacina-mapa", "value"),
-)
-def update_vacina_options(ano, tipo_unidade, escola, modalidade):
-    df = n_vacinas_escola.copy()
-    if ano is not None:
-        df = df[df["data_vacinacao_ano"] == ano]
-    if tipo_unidade is not None and tipo_unidade != "Todas":
-        df = df[df["tipo_unidade"] == tipo_unidade]
-    if escola is not None and escola != "Todas":
-        df = df[df["nome_unidade"] == escola]
-    if modalidade is not None and modalidade != "Todas":
-        df = df[df["modalidade"] == modalidade]
-
-    vacinas = sorted(df["vacina"].unique())
-    options = [{"label": "Todas", "value": "Todas"}] + [
-        {"label": formatar_label(v), "value": v} for v in vacinas
-    ]
+def atualizar_painel(
+    municipio, tipo_unidade, modalidade, ano_selecionado, vacina, escola, relayout=None
+):
+    filtros = normalizar_filtros(
+        data_vacinacao_ano=ano_selecionado,
+        tipo_unidade=tipo_unidade,
+        modalidade=modalidade,
+        vacina=vacina,
+        nome_unidade=escola,
+    )
+    # uma única leitura da referência: a requisição inteira usa a mesma versão
+    particao = particao_do_municipio(municipio)
+    base = particao.dados.obter()
+    rotulos = base.rotulos
+    with fase("consulta"):
+        if cache_consultas is None:
+            consulta = resolver_consulta(base.cubo, base.indice, filtros)
+        else:
+            consulta, acerto = cache_consultas.consultar(
+                base.versao,
+                filtros,
+                lambda: resolver_consulta(base.cubo, base.indice, filtros),
+                particao=particao.municipio.codigo,
+            )
+            anotar(cache="acerto" if acerto else "falha")
+    opcoes = consulta.opcoes
 
-    return options
+    with fase("mapa"):
+        areas = base.extras.get("areas")
+        if MAPA_VIEWPORT:
+            marcadores = marcadores_visiveis(particao, base, consulta, relayout)
+            if ctx.triggered_id == "mapa-vacinacao":
+                # arrastar ou dar zoom só troca os marcadores
+                mapa = atualizar_mapa(
+                    consulta, particao, marcadores, reposicionar=False
+                )
+                return (mapa, *[no_update] * (len(SAIDAS_PAINEL) - 1))
+            mapa = atualizar_mapa(consulta, particao, marcadores, areas=areas)
+        else:
+            mapa = atualizar_mapa(consulta, particao, areas=areas)
+    with fase("formatacao"):
+        cards = (
+            format_decimal(consulta.n_alunos, locale="pt_BR"),
+            format_decimal(consulta.n_vacinas, locale="pt_BR"),
+            format_decimal(consulta.media_idade, locale="pt_BR"),
+        )
+        listas = (
+            get_options_dropdown(
+                opcoes["nome_unidade"], rotulos["nome_unidade"].get, include_all=True
+            ),
+            get_options_dropdown(
+                opcoes["vacina"], rotulos["vacina"].get, include_all=True
+            ),
+            get_options_dropdown(
+                opcoes["modalidade"], rotulos["modalidade"].get, include_all=True
+            ),
+            get_options_dropdown(opcoes["tipo_unidade"], include_all=True),
+        )
+    return (mapa, *cards, *listas)
 
 
 @app.callback(
-    Output("dropdown-modalidade", "options"),
-    # Output("dropdown-modalidade", "value"),
+    Output("grafico-tendencia", "figure"),
     [
-        Input("dropdown-ano", "value"),
+        Input("dropdown-municipio", "value"),
         Input("dropdown-tp-unidade", "value"),
-        Input("select-escola-mapa", "value"),
+        Input("dropdown-modalidade", "value"),
+        Input("dropdown-ano", "value"),
         Input("dropdown-vacina-mapa", "value"),
+        Input("select-escola-mapa", "value"),
+        Input("dropdown-tendencia-por", "value"),
+        Input("check-tendencia-empilhar", "value"),
     ],
-    # State("dropdown-modalidade", "value"),
 )
-def update_modalidade_options(ano, tipo_unidade, escola, vacina):
-    df = n_vacinas_escola.copy()
-    if ano is not None:
-        df = df[df["data_vacinacao_ano"] == ano]
-    if tipo_unidade is not None and tipo_unidade != "Todas":
-        df = df[df["tipo_unidade"] == tipo_unidade]
-    if escola is not None and escola != "Todas":
-        df = df[df["nome_unidade"] == escola]
-    if vacina is not None and vacina != "Todas":
-        df = df[df["vacina"] == vacina]
-
-    modalidades = sorted(df["modalidade"].dropna().unique())
-    options = [{"label": "Todas", "value": "Todas"}] + [
-        {"label": formatar_label(m), "value": m} for m in modalidades
-    ]
-
-    return options
+def atualizar_tendencia(
+    municipio, tipo_unidade, modalidade, ano_selecionado, vacina, escola, por, empilhar
+):
+    # o ano selecionado só é marcado no gráfico; as séries cobrem todos os anos
+    filtros = normalizar_filtros(
+        tipo_unidade=tipo_unidade,
+        modalidade=modalidade,
+        vacina=vacina,
+        nome_unidade=escola,
+    )
+    base = particao_do_municipio(municipio).dados.obter()
+    por = None if por == "total" else por
+    with fase("consulta"):
+        valores, matriz = base.series.series(filtros, por)
+    with fase("grafico"):
+        return montar_tendencia(
+            base, valores, matriz, por, "empilhar" in (empilhar or []), ano_selecionado
+        )
 
 
 @app.callback(
-    Output("dropdown-tp-unidade", "options"),
-    # Output("dropdown-tp-unidade", "value"),
     [
-        Input("dropdown-ano", "value"),
+        Output("tabela-ranking", "data"),
+        Output("tabela-ranking", "page_count"),
+        Output("tabela-ranking", "page_current"),
+    ],
+    [
+        Input("dropdown-municipio", "value"),
+        Input("dropdown-tp-unidade", "value"),
         Input("dropdown-modalidade", "value"),
-        Input("select-escola-mapa", "value"),
+        Input("dropdown-ano", "value"),
         Input("dropdown-vacina-mapa", "value"),
+        Input("tabela-ranking", "page_current"),
+        Input("tabela-ranking", "page_size"),
+        Input("tabela-ranking", "sort_by"),
+        Input("tabela-ranking", "filter_query"),
     ],
-    # State("dropdown-tp-unidade", "value"),
 )
-def update_tipo_unidade_options(ano, modalidade, escola, vacina):
-    df = n_vacinas_escola.copy()
-    if ano is not None:
-        df = df[df["data_vacinacao_ano"] == ano]
-    if modalidade is not None and modalidade != "Todas":
-        df = df[df["modalidade"] == modalidade]
-    if escola is not None and escola != "Todas":
-        df = df[df["nome_unidade"] == escola]
-    if vacina is not None and vacina != "Todas":
-        df = df[df["vacina"] == vacina]
-
-    tipos = sorted(df["tipo_unidade"].dropna().unique())
-    options = [{"label": "Todas", "value": "Todas"}] + [
-        {"label": t, "value": t} for t in tipos
-    ]
-
-    return options
+def atualizar_ranking(
+    municipio,
+    tipo_unidade,
+    modalidade,
+    ano_selecionado,
+    vacina,
+    pagina,
+    tamanho_pagina,
+    sort_by,
+    filter_query,
+):
+    # todas as escolas do recorte: a escola selecionada no mapa não filtra
+    filtros = normalizar_filtros(
+        data_vacinacao_ano=ano_selecionado,
+        tipo_unidade=tipo_unidade,
+        modalidade=modalidade,
+        vacina=vacina,
+        nome_unidade="Todas",
+    )
+    particao = particao_do_municipio(municipio)
+    base = particao.dados.obter()
+    with fase("consulta"):
+        if cache_rankings is None:
+            ranking = RankingEscolas(base.cubo, filtros)
+        else:
+            ranking, _ = cache_rankings.consultar(
+                base.versao,
+                filtros,
+                lambda: RankingEscolas(base.cubo, filtros),
+                particao=particao.municipio.codigo,
+            )
+    if ctx.triggered_id not in (None, "tabela-ranking"):
+        # recorte novo nos dropdowns: volta para a primeira página
+        pagina = 0
+    with fase("pagina"):
+        return ranking.pagina(
+            pagina, tamanho_pagina or TAMANHO_PAGINA_RANKING, sort_by, filter_query
+        )
 
 
-# callback para selecionar o tipo de unidade escolar
 @app.callback(
-    Output("mapa-vacinacao", "figure"),
     [
+        Output(f"link-exportar-{tabela}-{formato}", "href")
+        for tabela, formato, _ in LINKS_EXPORTACAO
+    ],
+    [
+        Input("dropdown-municipio", "value"),
         Input("dropdown-tp-unidade", "value"),
         Input("dropdown-modalidade", "value"),
         Input("dropdown-ano", "value"),
@@ -480,91 +1200,55 @@ def update_tipo_unidade_options(ano, modalidade, escola, vacina):
         Input("select-escola-mapa", "value"),
     ],
 )
-def update_map(tipo_unidade, modalidade, ano_selecionado, vacina, escola):
-
-    with open(SHP_FOLDER / "osasco.geojson", "r", encoding="utf-8") as f:
-        osasco_geojson = json.load(f)
-
-    # Filtro para mostrar todos os dados quando dropdown esvaziado (clear value)
-    if tipo_unidade is None:
-        tipo_unidade = "Todas"
-    if vacina is None:
-        vacina = "Todas"
-    if escola is None:
-        escola = "Todas"
-    if modalidade is None:
-        modalidade = "Todas"
-
-    # Filtrar por ano
-    df = n_vacinas_escola[n_vacinas_escola["data_vacinacao_ano"] == ano_selecionado]
+def atualizar_links_exportacao(
+    municipio, tipo_unidade, modalidade, ano_selecionado, vacina, escola
+):
+    # só monta as URLs; o download vai direto para a rota de exportação
+    filtros = normalizar_filtros(
+        data_vacinacao_ano=ano_selecionado,
+        tipo_unidade=tipo_unidade,
+        modalidade=modalidade,
+        vacina=vacina,
+        nome_unidade=escola,
+    )
+    # com um único município a URL dispensa o parâmetro
+    municipio = municipio if VARIOS_MUNICIPIOS else None
+    return [
+        url_exportacao(tabela, formato, filtros, municipio)
+        for tabela, formato, _ in LINKS_EXPORTACAO
+    ]
 
-    # Filtrar por tipo de unidade
-    if tipo_unidade != "Todas":
-        df = df[df["tipo_unidade"] == tipo_unidade]
 
-    # Filtrar por vacina
-    if vacina != "Todas":
-        df = df[df["vacina"] == vacina]
+if MODO_CLIENTE:
+    # o navegador resolve os filtros a partir do pacote; nenhuma ida ao servidor
+    app.clientside_callback(
+        ClientsideFunction(namespace="painel", function_name="atualizar"),
+        SAIDAS_PAINEL,
+        ENTRADAS_PAINEL
+        + [State("mapa-vacinacao", "figure"), State("pacote-cliente", "data")],
+    )
+else:
+    app.callback(SAIDAS_PAINEL, ENTRADAS_PAINEL)(atualizar_painel)
 
-    # Filtrar por escola
-    if escola != "Todas":
-        df = df[df["nome_unidade"] == escola]
 
-    # Filtrar por modalidade
-    if modalidade != "Todas":
-        df = df[df["modalidade"] == modalidade]
+def iniciar_recarga(recarga_no_master=False):
+    # threads não sobrevivem ao fork: com gunicorn é chamada em cada worker.
+    # Com ``recarga_no_master`` os municípios herdados do master são
+    # verificados por ele; o worker só cuida dos que carregou sozinho
+    herdados = [particao.municipio.codigo for particao in municipios.particoes()]
+    municipios.iniciar_monitoramento(
+        RECARGA_INTERVALO, ignorar=herdados if recarga_no_master else ()
+    )
 
-    df_escola = df.groupby(["latitude", "longitude", "nome_unidade"], as_index=False)[
-        "n_vacinas"
-    ].sum()
 
-    # Definir zoom da escola selecionada
-    if escola != "Todas" and not df_escola.empty:
-        lat = df_escola.iloc[0]["latitude"]
-        lon = df_escola.iloc[0]["longitude"]
-        center = dict(lat=lat, lon=lon)
-        zoom = 13
-    else:
-        center = dict(lat=-23.5324, lon=-46.7916)
-        zoom = 11
-
-    mapa_osasco = px.scatter_map(
-        df_escola,
-        lat="latitude",
-        lon="longitude",
-        size="n_vacinas",
-        hover_data={"nome_unidade": True, "n_vacinas": True, "latitude": False, "longitude": False},
-        custom_data=["nome_unidade", "n_vacinas"],
-        zoom=zoom,
-        center=center,
-        height=600,
-        labels={"nome_unidade": "Nome da unidade", "n_vacinas": "Número de vacinas"},
-    )
-    mapa_osasco.update_layout(
-        map=dict(
-            style="outdoors",
-            center=center,
-            zoom=zoom,
-            layers=[
-                dict(
-                    sourcetype="geojson",
-                    source=osasco_geojson,
-                    type="fill",
-                    color="rgba(0,0,255,0.2)",
-                ),
-                dict(
-                    sourcetype="geojson",
-                    source=osasco_geojson,
-                    type="line",
-                    color="blue",
-                    line=dict(width=1),
-                ),
-            ],
-        ),
-        margin={"r": 0, "t": 0, "l": 0, "b": 60},
+def iniciar_recarga_master(reciclar_workers):
+    # no master do gunicorn (preload): a base nova é montada uma única vez e
+    # ``reciclar_workers`` troca os workers por novos, que a herdam por fork
+    municipios.iniciar_monitoramento(
+        RECARGA_INTERVALO, ao_recarregar=reciclar_workers
     )
-    return mapa_osasco
 
 
 if __name__ == "__main__":
+    iniciar_recarga()
     app.run(debug=True)
@@ -0,0 +1,214 @@
+// Modo clientside (PAINEL_MODO_CLIENTE=1): o navegador baixa uma vez a folha
+// do cubo em arrays tipados e resolve mapa, cards e dropdowns sem ir ao servidor.
+(function () {
+    const TODAS = "Todas";
+    const DIMENSOES = [
+        "data_vacinacao_ano",
+        "tipo_unidade",
+        "modalidade",
+        "vacina",
+        "nome_unidade",
+    ];
+    // posição de cada dropdown em cascata em DIMENSOES
+    const DIM_TIPO = 1;
+    const DIM_MODALIDADE = 2;
+    const DIM_VACINA = 3;
+    const DIM_ESCOLA = 4;
+    const ARRAYS = {int16: Int16Array, int32: Int32Array, float64: Float64Array};
+    const formatoNumero = new Intl.NumberFormat("pt-BR", {maximumFractionDigits: 3});
+
+    let carregamento = null;
+
+    function carregarPacote(meta) {
+        if (carregamento === null || carregamento.url !== meta.url) {
+            const promessa = fetch(meta.url)
+                .then(function (resposta) {
+                    if (!resposta.ok) {
+                        throw new Error("Falha ao baixar " + meta.url);
+                    }
+                    return resposta.arrayBuffer();
+                })
+                .then(function (buffer) {
+                    const colunas = {};
+                    Object.entries(meta.colunas).forEach(function ([nome, coluna]) {
+                        colunas[nome] = new ARRAYS[coluna.tipo](
+                            buffer, coluna.deslocamento, meta.n_linhas
+                        );
+                    });
+                    const codigos = {};
+                    Object.entries(meta.dicionarios).forEach(function ([dim, valores]) {
+                        codigos[dim] = new Map(
+                            valores.map(function (valor, i) { return [String(valor), i]; })
+                        );
+                    });
+                    return {colunas: colunas, codigos: codigos};
+                })
+                .catch(function (erro) {
+                    // permite nova tentativa na próxima interação
+                    carregamento = null;
+                    throw erro;
+                });
+            carregamento = {url: meta.url, promessa: promessa};
+        }
+        return carregamento.promessa;
+    }
+
+    function opcoesDropdown(meta, dim, marcados) {
+        // rótulos já formatados no servidor, na ordem do dicionário
+        const valores = meta.dicionarios[dim];
+        const rotulos = meta.rotulos[dim];
+        const opcoes = [{label: TODAS, value: TODAS}];
+        for (let i = 0; i < valores.length; i++) {
+            if (marcados[i]) {
+                opcoes.push({label: rotulos[i], value: valores[i]});
+            }
+        }
+        return opcoes;
+    }
+
+    // mesmas entradas do callback do servidor; o pacote já é de um único
+    // município, que só entra no uirevision (como no servidor)
+    async function atualizar(
+        municipio, tipoUnidade, modalidade, ano, vacina, escola, figura, meta
+    ) {
+        const pacote = await carregarPacote(meta);
+        const colunas = pacote.colunas;
+        const filtros = [ano, tipoUnidade, modalidade, vacina, escola];
+        // -1: "Todas" (ou dropdown esvaziado); -2: valor ausente do pacote
+        const selecao = DIMENSOES.map(function (dim, d) {
+            const valor = filtros[d];
+            if (valor === null || valor === undefined || valor === TODAS) {
+                return -1;
+            }
+            const codigo = pacote.codigos[dim].get(String(valor));
+            return codigo === undefined ? -2 : codigo;
+        });
+        const semAno = selecao[0] === -1;
+        const codigosDims = DIMENSOES.map(function (dim) { return colunas[dim]; });
+        const nVacinas = colunas.n_vacinas;
+        const idadeSoma = colunas.idade_soma;
+        const idadeContagem = colunas.idade_contagem;
+
+        const escolas = meta.dicionarios.nome_unidade;
+        const vacinasEscola = new Float64Array(escolas.length);
+        const escolaNoMapa = new Uint8Array(escolas.length);
+        const marcados = DIMENSOES.map(function (dim) {
+            return new Uint8Array(meta.dicionarios[dim].length);
+        });
+        let totalVacinas = 0;
+        let somaIdade = 0;
+        let contagemIdade = 0;
+
+        // uma passada: cada linha entra nas saídas cujos filtros ela satisfaz
+        for (let i = 0; i < meta.n_linhas; i++) {
+            let falhas = 0;
+            let falhou = -1;
+            for (let d = 0; d < DIMENSOES.length; d++) {
+                const s = selecao[d];
+                if (s !== -1 && codigosDims[d][i] !== s) {
+                    falhas++;
+                    falhou = d;
+                    if (falhas > 1) {
+                        break;
+                    }
+                }
+            }
+            if (falhas === 0) {
+                for (let d = DIM_TIPO; d <= DIM_ESCOLA; d++) {
+                    const codigo = codigosDims[d][i];
+                    if (codigo >= 0) {
+                        marcados[d][codigo] = 1;
+                    }
+                }
+                somaIdade += idadeSoma[i];
+                contagemIdade += idadeContagem[i];
+                if (!semAno) {
+                    totalVacinas += nVacinas[i];
+                    const codigoEscola = codigosDims[DIM_ESCOLA][i];
+                    if (codigoEscola >= 0) {
+                        vacinasEscola[codigoEscola] += nVacinas[i];
+                        escolaNoMapa[codigoEscola] = 1;
+                    }
+                }
+            } else if (falhas === 1) {
+                if (falhou === 0) {
+                    // média de idade considera todos os anos
+                    somaIdade += idadeSoma[i];
+                    contagemIdade += idadeContagem[i];
+                } else {
+                    // opções de uma dimensão ignoram o próprio filtro
+                    const codigo = codigosDims[falhou][i];
+                    if (codigo >= 0) {
+                        marcados[falhou][codigo] = 1;
+                    }
+                }
+            }
+        }
+
+        const lat = [];
+        const lon = [];
+        const tamanhos = [];
+        const customdata = [];
+        for (let e = 0; e < escolas.length; e++) {
+            const latitude = meta.unidades.latitude[e];
+            const longitude = meta.unidades.longitude[e];
+            if (escolaNoMapa[e] && latitude !== null && longitude !== null) {
+                lat.push(latitude);
+                lon.push(longitude);
+                tamanhos.push(vacinasEscola[e]);
+                customdata.push([escolas[e], vacinasEscola[e]]);
+            }
+        }
+        const escolaSelecionada = selecao[DIM_ESCOLA] !== -1;
+        const centro = escolaSelecionada && lat.length > 0
+            ? {lat: lat[0], lon: lon[0]}
+            : meta.centro;
+        const zoom = escolaSelecionada && lat.length > 0 ? 13 : meta.zoom;
+        const maiorTamanho = tamanhos.length > 0 ? Math.max.apply(null, tamanhos) : 0;
+
+        const traco = figura.data[0];
+        const novaFigura = Object.assign({}, figura, {
+            data: [Object.assign({}, traco, {
+                lat: lat,
+                lon: lon,
+                customdata: customdata,
+                marker: Object.assign({}, traco.marker, {
+                    size: tamanhos,
+                    sizeref: maiorTamanho > 0
+                        ? maiorTamanho / (meta.tamanho_maximo * meta.tamanho_maximo)
+                        : 1,
+                }),
+            })],
+            layout: Object.assign({}, figura.layout, {
+                map: Object.assign({}, figura.layout.map, {
+                    center: centro,
+                    zoom: zoom,
+                    uirevision: municipio + ":" +
+                        (escola === null || escola === undefined ? TODAS : escola),
+                }),
+            }),
+        });
+
+        const codigoAlunos = selecao[DIM_ESCOLA] + "|" + selecao[DIM_TIPO];
+        const nAlunos = selecao[DIM_ESCOLA] === -2 || selecao[DIM_TIPO] === -2
+            ? 0
+            : meta.alunos[codigoAlunos] || 0;
+        const mediaIdade = contagemIdade > 0
+            ? Math.round((somaIdade / contagemIdade) * 10) / 10
+            : NaN;
+
+        return [
+            novaFigura,
+            formatoNumero.format(nAlunos),
+            formatoNumero.format(semAno ? 0 : totalVacinas),
+            formatoNumero.format(mediaIdade),
+            opcoesDropdown(meta, "nome_unidade", marcados[DIM_ESCOLA]),
+            opcoesDropdown(meta, "vacina", marcados[DIM_VACINA]),
+            opcoesDropdown(meta, "modalidade", marcados[DIM_MODALIDADE]),
+            opcoesDropdown(meta, "tipo_unidade", marcados[DIM_TIPO]),
+        ];
+    }
+
+    window.dash_clientside = window.dash_clientside || {};
+    window.dash_clientside.painel = {atualizar: atualizar};
+})();
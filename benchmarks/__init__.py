@@ -0,0 +1,12 @@
+"""Benchmarks do painel com extratos sintéticos.
+
+Uso::
+
+    python -m benchmarks --linhas 10000 100000 1000000
+
+Para cada escala gera ``n_vacinas_escola.csv`` e ``n_alunos.csv`` com o mesmo
+esquema dos extratos reais (``benchmarks.gerador``) e mede, num processo
+separado (``benchmarks.medir``), a carga dos dados, o tempo de cada cenário do
+callback do painel, o pico de memória e o tamanho das respostas. O resultado é
+gravado em JSON em ``benchmarks/resultados/`` para comparação entre versões.
+"""
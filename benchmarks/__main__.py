@@ -0,0 +1,96 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.gerador import gerar_extratos
+
+RAIZ = Path(__file__).resolve().parent.parent
+PASTA_RESULTADOS = Path(__file__).resolve().parent / "resultados"
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=RAIZ,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar_escala(linhas, repeticoes, semente):
+    with tempfile.TemporaryDirectory(prefix="painel-bench-") as pasta:
+        data_path = Path(pasta) / "data"
+        inicio = time.perf_counter()
+        extratos = gerar_extratos(data_path, linhas, semente=semente)
+        tempo_geracao = time.perf_counter() - inicio
+        # processo novo por escala: memória e imports não vazam entre medições
+        saida = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.medir",
+                str(data_path),
+                "--repeticoes",
+                str(repeticoes),
+            ],
+            cwd=RAIZ,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return {
+            **extratos,
+            "tempo_geracao_s": round(tempo_geracao, 3),
+            **json.loads(saida.stdout.splitlines()[-1]),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do painel")
+    parser.add_argument(
+        "--linhas", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--repeticoes", type=int, default=20)
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--saida", type=Path, default=None)
+    args = parser.parse_args()
+
+    gerado_em = datetime.now().astimezone()
+    resultados = []
+    for linhas in args.linhas:
+        print(f"{linhas} linhas...", file=sys.stderr)
+        resultados.append(executar_escala(linhas, args.repeticoes, args.semente))
+
+    saida = args.saida or (
+        PASTA_RESULTADOS / f"{gerado_em.strftime('%Y%m%dT%H%M%S')}.json"
+    )
+    saida.parent.mkdir(parents=True, exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "gerado_em": gerado_em.isoformat(timespec="seconds"),
+                "commit": _commit(),
+                "python": platform.python_version(),
+                "plataforma": platform.platform(),
+                "repeticoes": args.repeticoes,
+                "resultados": resultados,
+            },
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+    print(saida)
+
+
+if __name__ == "__main__":
+    main()
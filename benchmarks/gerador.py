@@ -0,0 +1,127 @@
+"""Extratos sintéticos com o esquema de ``n_vacinas_escola.csv`` e ``n_alunos.csv``.
+
+Uso::
+
+    python -m benchmarks.gerador --linhas 1000000 --destino /tmp/painel/data
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+TIPOS_UNIDADE = ["CEMEI", "CEMEIEF", "CRECHE", "EMEF", "EMEI", "EMEIEF", "ESCPARC"]
+MODALIDADES = [
+    "EDUCAÇÃO INFANTIL",
+    "ENSINO FUNDAMENTAL",
+    "EDUCAÇÃO DE JOVENS E ADULTOS",
+    "CRECHE",
+]
+VACINAS = [
+    "VACINA BCG",
+    "VACINA HEPATITE B",
+    "VACINA PENTAVALENTE",
+    "VACINA POLIOMIELITE INATIVADA",
+    "VACINA ROTAVÍRUS HUMANO",
+    "VACINA PNEUMOCÓCICA 10-VALENTE",
+    "VACINA MENINGOCÓCICA C",
+    "VACINA FEBRE AMARELA",
+    "VACINA SARAMPO, CAXUMBA, RUBÉOLA",
+    "VACINA SARAMPO, CAXUMBA, RUBÉOLA E VARICELA",
+    "VACINA HEPATITE A",
+    "VACINA DIFTERIA, TÉTANO, PERTUSSIS",
+    "VACINA DIFTERIA E TÉTANO ADULTO",
+    "VACINA VARICELA",
+    "VACINA HPV QUADRIVALENTE",
+    "VACINA INFLUENZA",
+    "VACINA COVID-19",
+]
+# anos anteriores a ANO_MINIMO entram de propósito, para exercitar o corte
+ANOS = (2012, 2025)
+# retângulo que cobre o município de Osasco
+LATITUDES = (-23.58, -23.48)
+LONGITUDES = (-46.83, -46.74)
+
+LINHAS_POR_LOTE = 1_000_000
+
+
+def gerar_escolas(n_escolas, rng):
+    return pd.DataFrame(
+        {
+            "tipo_unidade": rng.choice(TIPOS_UNIDADE, n_escolas),
+            "nome_unidade": [f"ESCOLA SINTÉTICA {i:04d}" for i in range(n_escolas)],
+            "latitude": rng.uniform(*LATITUDES, n_escolas),
+            "longitude": rng.uniform(*LONGITUDES, n_escolas),
+        }
+    )
+
+
+def _lote(n, escolas, n_alunos, rng):
+    # cada aluno tem uma escola de origem; ~10% das aplicações são em outra
+    # unidade, o que faz o mesmo RA aparecer em várias escolas
+    ra = rng.integers(0, n_alunos, n)
+    escola = ra % len(escolas)
+    mudou = rng.random(n) < 0.1
+    escola[mudou] = rng.integers(0, len(escolas), mudou.sum())
+    linhas = escolas.iloc[escola].reset_index(drop=True)
+    # vacinas mais comuns primeiro (distribuição de Zipf truncada)
+    pesos = 1 / np.arange(1, len(VACINAS) + 1)
+    idade = np.round(rng.gamma(2.0, 3.0, n), 2)
+    idade[rng.random(n) < 0.01] = np.nan
+    return linhas.assign(
+        data_vacinacao_ano=rng.integers(ANOS[0], ANOS[1] + 1, n),
+        modalidade=rng.choice(MODALIDADES, n),
+        vacina=rng.choice(VACINAS, n, p=pesos / pesos.sum()),
+        idade=idade,
+        n_vacinas=rng.integers(1, 4, n),
+        ra=ra,
+    )
+
+
+def gerar_extratos(destino, linhas, n_escolas=None, semente=0):
+    """Grava os dois CSVs em ``destino`` em lotes, sem montar tudo em memória."""
+    destino = Path(destino)
+    destino.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(semente)
+    n_escolas = n_escolas or int(np.clip(linhas // 500, 20, 400))
+    escolas = gerar_escolas(n_escolas, rng)
+    n_alunos = max(linhas // 3, 1)
+
+    colunas_vacinas = [
+        "data_vacinacao_ano",
+        "tipo_unidade",
+        "modalidade",
+        "nome_unidade",
+        "latitude",
+        "longitude",
+        "vacina",
+        "idade",
+        "n_vacinas",
+    ]
+    caminho_vacinas = destino / "n_vacinas_escola.csv"
+    caminho_alunos = destino / "n_alunos.csv"
+    linhas_alunos = 0
+    for inicio in range(0, linhas, LINHAS_POR_LOTE):
+        lote = _lote(min(LINHAS_POR_LOTE, linhas - inicio), escolas, n_alunos, rng)
+        primeiro = inicio == 0
+        opcoes = {"sep": ";", "index": False, "mode": "w" if primeiro else "a"}
+        lote[colunas_vacinas].to_csv(caminho_vacinas, header=primeiro, **opcoes)
+        alunos = lote[["tipo_unidade", "nome_unidade", "ra"]].drop_duplicates()
+        alunos.to_csv(caminho_alunos, header=primeiro, **opcoes)
+        linhas_alunos += len(alunos)
+    return {"linhas": linhas, "linhas_alunos": linhas_alunos, "escolas": n_escolas}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--linhas", type=int, required=True)
+    parser.add_argument("--destino", type=Path, required=True)
+    parser.add_argument("--escolas", type=int, default=None)
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+    print(gerar_extratos(args.destino, args.linhas, args.escolas, args.semente))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Mede carga, callbacks e memória do painel sobre uma pasta de extratos.
+
+Uso (normalmente chamado por ``python -m benchmarks``)::
+
+    python -m benchmarks.medir /tmp/painel/data --repeticoes 20
+
+Roda num processo próprio para que o pico de RSS seja só desta escala e
+imprime um JSON com os resultados na saída padrão.
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from plotly.utils import PlotlyJSONEncoder
+
+
+def _tamanho_json(valor):
+    return len(json.dumps(valor, cls=PlotlyJSONEncoder).encode())
+
+
+def _rss_max_mb():
+    # ru_maxrss em KiB no Linux e em bytes no macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _resumo(tempos):
+    tempos = sorted(tempos)
+    return {
+        "mediana_ms": round(statistics.median(tempos) * 1000, 3),
+        "p95_ms": round(tempos[int(0.95 * (len(tempos) - 1))] * 1000, 3),
+        "min_ms": round(tempos[0] * 1000, 3),
+    }
+
+
+def cenarios(base):
+    """Estados dos filtros típicos: (tipo, modalidade, ano, vacina, escola)."""
+    folha = base.cubo.cuboides[("nome_unidade",)]
+    # a escola com mais vacinas é a que mais aparece no clique do mapa
+    escola = folha["n_vacinas"].idxmax()[0]
+    tipo = base.cubo.cuboides[("tipo_unidade",)]["n_vacinas"].idxmax()[0]
+    vacina = base.cubo.cuboides[("vacina",)]["n_vacinas"].idxmax()[0]
+    return {
+        "inicial": ("Todas", "Todas", base.ano_max, "Todas", "Todas"),
+        "tipo_unidade": (tipo, "Todas", base.ano_max, "Todas", "Todas"),
+        "vacina": ("Todas", "Todas", base.ano_max, vacina, "Todas"),
+        "escola": ("Todas", "Todas", base.ano_max, "Todas", escola),
+        "sem_ano": ("Todas", "Todas", None, "Todas", "Todas"),
+    }
+
+
+def medir(data_path, repeticoes):
+    os.environ["PAINEL_DATA_PATH"] = str(data_path)
+    # mede o callback em si, sem o cache de resultados nem a recarga
+    os.environ["PAINEL_CACHE_TAMANHO"] = "0"
+    os.environ["PAINEL_RECARGA_INTERVALO"] = "0"
+
+    # bibliotecas importadas antes: a carga medida é a dos dados do painel
+    import dash  # noqa: F401
+    import dash_bootstrap_components  # noqa: F401
+    import plotly.graph_objects  # noqa: F401
+
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    import app
+
+    tempo_carga = time.perf_counter() - inicio
+    _, pico_carga = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    from src.consulta import resolver_consulta
+    from src.cubo import DIMENSOES, normalizar_filtros
+
+    base = app.municipios.obter(app.MUNICIPIO_PADRAO).dados.obter()
+    resultados = {}
+    for nome, entradas in cenarios(base).items():
+        tempos_consulta, tempos_callback = [], []
+        for _ in range(repeticoes):
+            tipo, modalidade, ano, vacina, escola = entradas
+            filtros = normalizar_filtros(
+                data_vacinacao_ano=ano,
+                tipo_unidade=tipo,
+                modalidade=modalidade,
+                vacina=vacina,
+                nome_unidade=escola,
+            )
+            inicio = time.perf_counter()
+            resolver_consulta(base.cubo, base.indice, filtros)
+            tempos_consulta.append(time.perf_counter() - inicio)
+
+            inicio = time.perf_counter()
+            saidas = app.atualizar_painel(app.MUNICIPIO_PADRAO, *entradas)
+            tempos_callback.append(time.perf_counter() - inicio)
+        resultados[nome] = {
+            "callback": _resumo(tempos_callback),
+            "consulta": _resumo(tempos_consulta),
+            "bytes_resposta": _tamanho_json(list(saidas)),
+        }
+
+    return {
+        "linhas_folha": len(base.cubo.cuboides[DIMENSOES]),
+        "tempo_carga_s": round(tempo_carga, 3),
+        "memoria_pico_carga_mb": round(pico_carga / 2**20, 1),
+        "rss_max_mb": round(_rss_max_mb(), 1),
+        "bytes_layout": _tamanho_json(app.montar_layout()),
+        "cenarios": resultados,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("data_path", type=Path)
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(medir(args.data_path.resolve(), args.repeticoes)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Configuração do gunicorn para o painel.
+
+Uso::
+
+    gunicorn -c gunicorn.conf.py app:server
+
+Com ``preload_app`` os dados (snapshot Arrow ou CSVs), o cubo, o índice e os
+estáticos versionados são carregados uma única vez no processo master, antes do
+fork. Os workers herdam essas páginas por copy-on-write e só pagam pela memória
+que eles mesmos alocam, de modo que o consumo deixa de crescer linearmente com o
+número de workers. O snapshot só torna a carga mais rápida que a dos CSVs: ele é
+convertido em cópias do pandas e a base é montada a partir delas, então o que os
+workers compartilham é a base montada no master, não as páginas do snapshot.
+
+Variáveis de ambiente:
+
+- ``PAINEL_BIND``: endereço de escuta (padrão ``0.0.0.0:8050``);
+- ``PAINEL_WORKERS``: número de workers (padrão: núcleos da máquina);
+- ``PAINEL_THREADS``: threads por worker (padrão 4);
+- ``PAINEL_RECARGA_INTERVALO``: segundos entre verificações de novos dados
+  (padrão 60; ``0`` desliga a recarga);
+- ``PAINEL_RECARGA_MASTER``: ``1`` troca a recarga em cada worker pela
+  recarga no master com reinício dos workers (padrão ``0``).
+
+Por padrão a recarga roda numa thread de cada worker, iniciada em
+``post_fork`` (threads do master não sobrevivem ao fork): o worker monta a base
+nova e a troca em memória, sem reiniciar e sem perder o que é dele (caches de
+resultados e rankings, histogramas do ``/metrics``, municípios já carregados).
+O preço é a memória: cada worker monta a base nova a partir da própria cópia dos
+dados, então depois da primeira recarga ela deixa de ser compartilhada e o
+consumo volta a crescer linearmente com o número de workers.
+
+Com ``PAINEL_RECARGA_MASTER=1`` é o master que monta a base nova, uma única vez,
+e envia ``HUP`` ao próprio processo. Isso é um reinício dos workers a cada
+extrato ou delta novo: o gunicorn cria workers novos, que herdam a base por
+fork, e encerra os antigos depois das requisições em curso (até
+``graceful_timeout``). A memória volta a ser a de uma base mais o que cada
+worker aloca, mas os workers novos começam com caches e métricas vazios e
+recarregam sob demanda os municípios que não vêm do master.
+
+Com ``PAINEL_MUNICIPIOS_PATH`` só o município padrão vem do master; os demais
+são carregados pelo worker que os recebe primeiro e cada worker mantém até
+``PAINEL_MUNICIPIOS_RESIDENTES`` municípios em memória. Esses são sempre
+recarregados pelo próprio worker.
+"""
+
+import gc
+import multiprocessing
+import os
+import signal
+
+bind = os.environ.get("PAINEL_BIND", "0.0.0.0:8050")
+workers = int(os.environ.get("PAINEL_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.environ.get("PAINEL_THREADS", "4"))
+worker_class = "gthread"
+
+# carrega o app (e os dados) no master; os workers nascem com tudo pronto
+preload_app = True
+
+
+# opcional: recarga no master reiniciando os workers (ver acima)
+RECARGA_MASTER = os.environ.get("PAINEL_RECARGA_MASTER", "0") == "1"
+
+
+def _reciclar_workers():
+    # congela a base nova antes de os workers novos nascerem; o unfreeze deixa
+    # a coleta liberar ciclos das bases antigas que já saíram de uso
+    gc.unfreeze()
+    gc.collect()
+    gc.freeze()
+    os.kill(os.getpid(), signal.SIGHUP)
+
+
+def when_ready(server):
+    # move os objetos já carregados para a geração permanente: a coleta de lixo
+    # dos workers deixa de escrever nos cabeçalhos deles e as páginas continuam
+    # compartilhadas em vez de serem copiadas no primeiro ciclo do GC
+    gc.freeze()
+    if RECARGA_MASTER:
+        from app import iniciar_recarga_master
+
+        # when_ready não roda de novo no HUP: uma única thread no master
+        iniciar_recarga_master(_reciclar_workers)
+
+
+def post_fork(server, worker):
+    from app import iniciar_recarga
+
+    iniciar_recarga(recarga_no_master=RECARGA_MASTER)
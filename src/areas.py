@@ -0,0 +1,133 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from src.cubo import TODAS
+
+# arestas testadas por vez no point-in-polygon (limita a matriz pontos × arestas)
+ARESTAS_POR_LOTE = 4096
+
+
+def pontos_em_poligono(lon, lat, aneis):
+    """Máscara dos pontos dentro do polígono (regra par-ímpar, vetorizada).
+
+    ``aneis`` é a lista de anéis do polígono (contorno externo e buracos),
+    cada um como array (n, 2) de lon/lat; um ponto num buraco cruza um número
+    par de arestas e fica de fora.
+    """
+    lon = np.asarray(lon, dtype="float64")
+    lat = np.asarray(lat, dtype="float64")
+    dentro = np.zeros(len(lon), dtype=bool)
+    arestas = np.concatenate(
+        [np.stack([anel[:-1], anel[1:]], axis=1) for anel in aneis if len(anel) > 1]
+    )
+    for inicio in range(0, len(arestas), ARESTAS_POR_LOTE):
+        lote = arestas[inicio : inicio + ARESTAS_POR_LOTE]
+        x1, y1 = lote[:, 0, 0], lote[:, 0, 1]
+        x2, y2 = lote[:, 1, 0], lote[:, 1, 1]
+        # arestas que atravessam a horizontal do ponto
+        cruza = (y1[None, :] > lat[:, None]) != (y2[None, :] > lat[:, None])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cruzamento = x1 + (lat[:, None] - y1) * (x2 - x1) / (y2 - y1)
+        cruzamentos = cruza & (lon[:, None] < x_cruzamento)
+        dentro ^= (np.count_nonzero(cruzamentos, axis=1) % 2).astype(bool)
+    return dentro
+
+
+def _poligonos(geometria):
+    if geometria["type"] == "Polygon":
+        return [geometria["coordinates"]]
+    if geometria["type"] == "MultiPolygon":
+        return geometria["coordinates"]
+    return []
+
+
+class CamadaAreas:
+    """Polígonos de uma camada GeoJSON (município, distritos, ...).
+
+    ``propriedade`` é o campo de ``properties`` que identifica cada área; o
+    mesmo campo é usado como ``featureidkey`` no choropleth.
+    """
+
+    def __init__(self, caminho, propriedade):
+        with open(caminho, "r", encoding="utf-8") as f:
+            geojson = json.load(f)
+        self.propriedade = propriedade
+        self.areas = []
+        for feature in geojson["features"]:
+            nome = feature["properties"][propriedade]
+            for poligono in _poligonos(feature["geometry"]):
+                aneis = [np.asarray(anel, dtype="float64")[:, :2] for anel in poligono]
+                externo = aneis[0]
+                caixa = (*externo.min(axis=0), *externo.max(axis=0))
+                self.areas.append((nome, caixa, aneis))
+
+    def atribuir(self, longitude, latitude):
+        """Nome da área de cada ponto (``None`` fora de todas as áreas)."""
+        lon = np.asarray(longitude, dtype="float64")
+        lat = np.asarray(latitude, dtype="float64")
+        area = np.full(len(lon), None, dtype=object)
+        livres = np.ones(len(lon), dtype=bool)
+        for nome, (lon_min, lat_min, lon_max, lat_max), aneis in self.areas:
+            # caixa envolvente primeiro: só os candidatos vão para o teste exato
+            candidatos = np.flatnonzero(
+                livres
+                & (lon >= lon_min)
+                & (lon <= lon_max)
+                & (lat >= lat_min)
+                & (lat <= lat_max)
+            )
+            if len(candidatos) == 0:
+                continue
+            dentro = pontos_em_poligono(lon[candidatos], lat[candidatos], aneis)
+            dentro = candidatos[dentro]
+            area[dentro] = nome
+            livres[dentro] = False
+        return area
+
+
+class AreasEscolas:
+    """Área de cada unidade e alunos distintos por área, calculados na carga.
+
+    Por requisição resta só somar ``n_vacinas`` das escolas da consulta por
+    área; nenhuma geometria é processada.
+    """
+
+    def __init__(self, camada, cubo):
+        unidades = cubo.unidades
+        self.camada = camada
+        self.area = pd.Series(
+            camada.atribuir(unidades["longitude"], unidades["latitude"]),
+            index=unidades.index,
+            name="area",
+        ).dropna()
+        conjuntos = cubo.conjuntos_alunos
+        tipos = [TODAS, *conjuntos.folhas.unique(level="tipo_unidade")]
+        self.alunos = {}
+        for nome, escolas in self.area.groupby(self.area).groups.items():
+            escolas = list(escolas)
+            for tipo in tipos:
+                filtros = {"nome_unidade": escolas}
+                if tipo != TODAS:
+                    filtros["tipo_unidade"] = tipo
+                self.alunos[(nome, tipo)] = conjuntos.contar(**filtros)
+
+    def agregar(self, escolas, tipo_unidade=TODAS):
+        """Vacinas, alunos distintos e vacinas por aluno em cada área."""
+        area = escolas["nome_unidade"].astype(object).map(self.area)
+        por_area = (
+            escolas.assign(area=area)
+            .dropna(subset=["area"])
+            .groupby("area")["n_vacinas"]
+            .sum()
+            .rename_axis("area")
+            .reset_index()
+        )
+        por_area["n_alunos"] = [
+            self.alunos.get((nome, tipo_unidade), 0) for nome in por_area["area"]
+        ]
+        por_area["vacinas_por_aluno"] = (
+            por_area["n_vacinas"] / por_area["n_alunos"].where(por_area["n_alunos"] > 0)
+        ).fillna(0.0)
+        return por_area
@@ -0,0 +1,173 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+
+class CacheMemoria:
+    """LRU em memória, local ao processo."""
+
+    def __init__(self, tamanho_maximo):
+        self.tamanho_maximo = tamanho_maximo
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            if chave not in self._itens:
+                return None
+            self._itens.move_to_end(chave)
+            return self._itens[chave]
+
+    def guardar(self, chave, valor):
+        despejados = 0
+        with self._lock:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho_maximo:
+                self._itens.popitem(last=False)
+                despejados += 1
+        return despejados
+
+    def invalidar(self, versao, prefixo=""):
+        # descarta as entradas de ``prefixo`` que não são da ``versao``
+        with self._lock:
+            for chave in [
+                c
+                for c in self._itens
+                if c.startswith(prefixo) and not c.startswith(f"{versao}-")
+            ]:
+                del self._itens[chave]
+
+    def __len__(self):
+        return len(self._itens)
+
+
+class CacheArquivos:
+    """LRU em disco, compartilhado entre workers que enxergam a mesma pasta.
+
+    Um arquivo pickle por chave; o mtime marca o último acesso e os mais
+    antigos são removidos quando a pasta passa do tamanho máximo. Workers
+    podem estar em versões diferentes dos dados durante uma recarga, então
+    nenhum apaga as entradas de outra versão: as chaves já levam a versão, e
+    as de versões antigas deixam de ser acessadas e saem primeiro no LRU.
+    """
+
+    def __init__(self, pasta, tamanho_maximo):
+        self.pasta = Path(pasta)
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        self.tamanho_maximo = tamanho_maximo
+
+    def _caminho(self, chave):
+        return self.pasta / f"{chave}.pkl"
+
+    def obter(self, chave):
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, "rb") as f:
+                valor = pickle.load(f)
+            os.utime(caminho)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            # ausente, ou removido/escrito por outro worker no meio da leitura
+            return None
+        return valor
+
+    def guardar(self, chave, valor):
+        caminho = self._caminho(chave)
+        temporario = caminho.with_name(f"{caminho.name}.{os.getpid()}.tmp")
+        with open(temporario, "wb") as f:
+            pickle.dump(valor, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # troca atômica: outro worker nunca lê um arquivo pela metade
+        os.replace(temporario, caminho)
+        return self._despejar()
+
+    def _arquivos(self):
+        arquivos = []
+        for caminho in self.pasta.glob("*.pkl"):
+            try:
+                arquivos.append((caminho.stat().st_mtime_ns, caminho))
+            except FileNotFoundError:
+                continue
+        return arquivos
+
+    def _despejar(self):
+        arquivos = self._arquivos()
+        excesso = len(arquivos) - self.tamanho_maximo
+        if excesso <= 0:
+            return 0
+        for _, caminho in sorted(arquivos)[:excesso]:
+            caminho.unlink(missing_ok=True)
+        return excesso
+
+    def invalidar(self, versao, prefixo=""):
+        # versão nova num worker não invalida a que outro ainda usa
+        pass
+
+    def __len__(self):
+        return len(self._arquivos())
+
+
+class CacheResultados:
+    """Memoização dos resultados de consulta por estado dos filtros.
+
+    A chave é a versão dos dados mais os filtros já normalizados (``None`` →
+    "Todas"), então uma recarga de dados nunca devolve resultado antigo; na
+    primeira consulta de uma versão nova as entradas das anteriores são
+    descartadas do cache em memória (no de arquivos elas saem pelo LRU). Com
+    ``particao`` (um município, por exemplo) cada partição tem a sua versão e
+    só descarta as próprias entradas.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.acertos = 0
+        self.falhas = 0
+        self.despejos = 0
+        self._versoes = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def chave(versao, filtros):
+        estado = repr(sorted(filtros.items())).encode()
+        return f"{versao}-{hashlib.sha1(estado).hexdigest()}"
+
+    def consultar(self, versao, filtros, calcular, particao=""):
+        # devolve o resultado e se ele veio do cache
+        prefixo = f"{particao}." if particao else ""
+        versao = f"{prefixo}{versao}"
+        if versao != self._versoes.get(particao):
+            self.backend.invalidar(versao, prefixo)
+            self._versoes[particao] = versao
+        chave = self.chave(versao, filtros)
+        valor = self.backend.obter(chave)
+        if valor is not None:
+            with self._lock:
+                self.acertos += 1
+            return valor, True
+        valor = calcular()
+        despejados = self.backend.guardar(chave, valor)
+        with self._lock:
+            self.falhas += 1
+            self.despejos += despejados
+        return valor, False
+
+    def estatisticas(self):
+        consultas = self.acertos + self.falhas
+        return {
+            "backend": type(self.backend).__name__,
+            "versoes": dict(self._versoes),
+            "entradas": len(self.backend),
+            "tamanho_maximo": self.backend.tamanho_maximo,
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "despejos": self.despejos,
+            "taxa_acerto": self.acertos / consultas if consultas else 0.0,
+        }
+
+
+def criar_cache(tamanho_maximo, pasta=None):
+    if pasta:
+        return CacheResultados(CacheArquivos(pasta, tamanho_maximo))
+    return CacheResultados(CacheMemoria(tamanho_maximo))
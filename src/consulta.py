@@ -0,0 +1,48 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from src.cubo import TODAS
+
+# dropdowns em cascata: cada um depende dos filtros das demais dimensões
+DIMENSOES_OPCOES = ("nome_unidade", "vacina", "modalidade", "tipo_unidade")
+
+
+@dataclass
+class ResultadoConsulta:
+    filtros: dict
+    escolas: pd.DataFrame
+    n_vacinas: int
+    n_alunos: int
+    media_idade: float
+    opcoes: dict
+
+
+def resolver_consulta(cubo, indice, filtros):
+    """Resolve o estado dos filtros uma única vez para todas as saídas.
+
+    Mapa, cards e as quatro listas de opções saem da mesma passada sobre o
+    cubo e o índice, em vez de cada callback refazer o próprio filtro.
+    """
+    sem_ano = filtros["data_vacinacao_ano"] == TODAS
+
+    escolas = cubo.por_escola(filtros)
+    if sem_ano:
+        escolas = escolas.head(0)
+
+    n_vacinas = 0 if sem_ano else cubo.total(filtros)["n_vacinas"]
+    # média de idade considera todos os anos
+    media_idade = cubo.media_idade(filtros, ignorar=("data_vacinacao_ano",))
+    n_alunos = cubo.n_alunos(filtros["nome_unidade"], filtros["tipo_unidade"])
+
+    opcoes = {dim: indice.valores(dim, filtros) for dim in DIMENSOES_OPCOES}
+
+    return ResultadoConsulta(
+        filtros=filtros,
+        escolas=escolas,
+        n_vacinas=n_vacinas,
+        n_alunos=n_alunos,
+        media_idade=np.round(media_idade, 1),
+        opcoes=opcoes,
+    )
@@ -0,0 +1,197 @@
+import copy
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from src.distintos import DIMENSOES_ALUNOS, ConjuntosAlunos
+
+TODAS = "Todas"
+
+# dimensões do cubo, na ordem canônica dos índices dos cuboides
+DIMENSOES = (
+    "data_vacinacao_ano",
+    "tipo_unidade",
+    "modalidade",
+    "vacina",
+    "nome_unidade",
+)
+
+MEDIDAS = ["n_vacinas", "idade_soma", "idade_contagem"]
+
+
+def normalizar_filtros(**filtros):
+    # dropdown esvaziado (clear value) equivale a "Todas"
+    return {
+        dim: (TODAS if valor is None else valor) for dim, valor in filtros.items()
+    }
+
+
+def _indexar(tabela, dims):
+    # garante MultiIndex mesmo quando o cuboide tem uma única dimensão
+    tabela = tabela.sort_index()
+    if not isinstance(tabela.index, pd.MultiIndex):
+        tabela.index = pd.MultiIndex.from_arrays([tabela.index], names=list(dims))
+    return tabela
+
+
+def agregar_folha(n_vacinas_escola):
+    # cuboide mais detalhado: uma linha por combinação observada das dimensões
+    # estornos (n_vacinas negativo, vindos dos deltas) também retiram a idade
+    # do registro estornado da soma e da contagem
+    sinal = np.where(n_vacinas_escola["n_vacinas"] < 0, -1, 1)
+    base = n_vacinas_escola.assign(
+        idade_soma=n_vacinas_escola["idade"].astype("float64") * sinal,
+        idade_contagem=n_vacinas_escola["idade"].notna().astype("int64") * sinal,
+    )
+    return base.groupby(list(DIMENSOES), dropna=False, observed=True)[MEDIDAS].sum()
+
+
+def somar_folhas(tabela, delta):
+    """Soma ``delta`` (mesmas dimensões) a ``tabela``, sem combinações zeradas.
+
+    Estornos que anulam uma combinação a removem, de modo que ela deixa de
+    aparecer nos dropdowns.
+    """
+    soma = tabela.add(delta, fill_value=0)
+    soma = soma[(soma[MEDIDAS] != 0).any(axis=1)]
+    return soma.astype(tabela.dtypes.to_dict())
+
+
+def extrair_unidades(n_vacinas_escola):
+    return (
+        n_vacinas_escola.dropna(subset=["latitude", "longitude"])
+        .drop_duplicates("nome_unidade")
+        .set_index("nome_unidade")[["latitude", "longitude"]]
+        .astype("float64")
+    )
+
+
+class CuboVacinas:
+    """Agregados pré-calculados para todas as combinações de filtros.
+
+    Para cada subconjunto das dimensões em ``DIMENSOES`` é mantido um cuboide
+    (soma de ``n_vacinas``, soma e contagem de ``idade``) indexado pelas
+    dimensões fixadas. Uma dimensão em "Todas" corresponde ao cuboide que não
+    a contém, de modo que os callbacks apenas consultam o índice ordenado em
+    vez de varrer a tabela completa.
+    """
+
+    def __init__(
+        self,
+        folha: pd.DataFrame,
+        unidades: pd.DataFrame,
+        n_alunos: pd.DataFrame,
+        alunos_aproximado: bool = False,
+    ):
+        # cada cuboide é agregado a partir do menor cuboide pai já calculado
+        # (uma dimensão a mais), nunca da tabela bruta
+        self.cuboides = {DIMENSOES: _indexar(folha, DIMENSOES)}
+        for k in range(len(DIMENSOES) - 1, 0, -1):
+            for dims in combinations(DIMENSOES, k):
+                pais = [
+                    self.cuboides[tuple(d for d in DIMENSOES if d in dims + (extra,))]
+                    for extra in DIMENSOES
+                    if extra not in dims
+                ]
+                tabela = (
+                    min(pais, key=len)
+                    .groupby(level=list(dims), dropna=False, observed=True)
+                    .sum()
+                )
+                self.cuboides[dims] = _indexar(tabela, dims)
+        self.total_geral = folha.sum()
+        self.unidades = unidades
+
+        # RAs por unidade montados uma vez; os recortes são uniões das folhas
+        self.conjuntos_alunos = ConjuntosAlunos(n_alunos, aproximado=alunos_aproximado)
+        self.alunos_distintos = self._contar_alunos()
+
+    def _contar_alunos(self):
+        alunos_distintos = {}
+        for k in range(len(DIMENSOES_ALUNOS) + 1):
+            for dims in combinations(DIMENSOES_ALUNOS, k):
+                alunos_distintos[dims] = self.conjuntos_alunos.contagens(dims)
+        return alunos_distintos
+
+    def com_delta(self, folha_delta, unidades, n_alunos):
+        """Novo cubo com ``folha_delta`` somada a cada cuboide.
+
+        Cada cuboide recebe só a agregação do delta nas suas dimensões, sem
+        voltar à folha completa; ``n_alunos`` traz os RAs novos por unidade.
+        O cubo atual não é alterado (requisições em curso continuam nele).
+        """
+        novo = copy.copy(self)
+        novo.cuboides = {}
+        for dims, tabela in self.cuboides.items():
+            parcial = folha_delta.groupby(
+                level=list(dims), dropna=False, observed=True
+            ).sum()
+            novo.cuboides[dims] = _indexar(
+                somar_folhas(tabela, _indexar(parcial, dims)), dims
+            )
+        novo.total_geral = self.total_geral + folha_delta.sum()
+        novo.unidades = unidades
+        novo.conjuntos_alunos = self.conjuntos_alunos.com_alunos(n_alunos)
+        novo.alunos_distintos = novo._contar_alunos()
+        return novo
+
+    def _fatia(self, dims, filtros):
+        # linhas do cuboide ``dims`` que satisfazem os filtros fixados
+        if not dims:
+            return self.total_geral.to_frame().T
+        tabela = self.cuboides[dims]
+        chave = tuple(filtros.get(dim, slice(None)) for dim in dims)
+        try:
+            return tabela.iloc[tabela.index.get_locs(chave)]
+        except KeyError:
+            return tabela.iloc[0:0]
+
+    def _fixados(self, filtros, ignorar=()):
+        return {
+            dim: valor
+            for dim, valor in filtros.items()
+            if valor != TODAS and dim not in ignorar
+        }
+
+    def total(self, filtros, ignorar=()):
+        fixados = self._fixados(filtros, ignorar)
+        dims = tuple(dim for dim in DIMENSOES if dim in fixados)
+        fatia = self._fatia(dims, fixados)
+        if fatia.empty:
+            return pd.Series(0, index=MEDIDAS)
+        return fatia.iloc[0]
+
+    def media_idade(self, filtros, ignorar=()):
+        total = self.total(filtros, ignorar)
+        if total["idade_contagem"] == 0:
+            return np.nan
+        return total["idade_soma"] / total["idade_contagem"]
+
+    def medidas_por_escola(self, filtros, ignorar=()):
+        # medidas somadas por escola no recorte dos filtros
+        fixados = self._fixados(filtros, ignorar)
+        dims = tuple(
+            dim for dim in DIMENSOES if dim in fixados or dim == "nome_unidade"
+        )
+        fatia = self._fatia(dims, fixados)
+        return fatia.groupby(level="nome_unidade", observed=True)[MEDIDAS].sum()
+
+    def por_escola(self, filtros):
+        n_vacinas = self.medidas_por_escola(filtros)["n_vacinas"]
+        return (
+            self.unidades.join(n_vacinas, how="inner")
+            .rename_axis("nome_unidade")
+            .reset_index()
+        )
+
+    def n_alunos(self, escola, tipo_unidade):
+        filtros = {"nome_unidade": escola, "tipo_unidade": tipo_unidade}
+        fixados = self._fixados(filtros)
+        dims = tuple(dim for dim in DIMENSOES_ALUNOS if dim in fixados)
+        if not dims:
+            return self.alunos_distintos[()]
+        chave = tuple(fixados[dim] for dim in dims)
+        return self.alunos_distintos[dims].get(
+            chave if len(chave) > 1 else chave[0], 0
+        )
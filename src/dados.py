@@ -0,0 +1,210 @@
+import hashlib
+import json
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from src.cubo import DIMENSOES, CuboVacinas, agregar_folha, extrair_unidades
+from src.indice import IndiceInvertido
+from src.series import SeriesAnuais
+from src.utils import formatar_label
+
+# colunas de texto repetidas em todas as linhas: guardadas como dicionário
+# (categorias) + códigos inteiros em vez de uma string Python por linha
+COLUNAS_CATEGORICAS = ["tipo_unidade", "modalidade", "vacina", "nome_unidade"]
+# coordenadas dependem só da unidade; o dicionário mantém o float64 exato
+COLUNAS_COORDENADAS = ["latitude", "longitude"]
+COLUNAS_CATEGORICAS_ALUNOS = ["tipo_unidade", "nome_unidade"]
+
+# idade fica em float64: em float32 o valor lido já não é o do extrato (6,48
+# vira 6,4800000191) e a média arredondada do card muda em ~1% dos recortes
+TIPOS_VACINAS = {
+    "data_vacinacao_ano": "int16",
+    "n_vacinas": "int32",
+}
+
+ANO_MINIMO = 2015
+
+# dimensões cujos rótulos nos dropdowns passam por formatar_label
+DIMENSOES_ROTULADAS = ["nome_unidade", "vacina", "modalidade"]
+
+PASTA_SNAPSHOT = "snapshot"
+MANIFESTO = "manifesto.json"
+
+
+def carregar_vacinas_escola(caminho):
+    tabela = pd.read_csv(
+        caminho,
+        sep=";",
+        dtype={coluna: "category" for coluna in COLUNAS_CATEGORICAS},
+    )
+    # há apenas poucas vacinas antes disso, parece sujeira
+    tabela = tabela[tabela["data_vacinacao_ano"] >= ANO_MINIMO]
+    tabela = tabela.astype(
+        {coluna: tipo for coluna, tipo in TIPOS_VACINAS.items() if coluna in tabela}
+        | {coluna: "category" for coluna in COLUNAS_COORDENADAS}
+    )
+    # categorias sem nenhuma linha depois do filtro de ano não viram opções
+    for coluna in COLUNAS_CATEGORICAS + COLUNAS_COORDENADAS:
+        tabela[coluna] = tabela[coluna].cat.remove_unused_categories()
+    return tabela.reset_index(drop=True)
+
+
+def carregar_alunos(caminho):
+    tabela = pd.read_csv(
+        caminho,
+        sep=";",
+        dtype={coluna: "category" for coluna in COLUNAS_CATEGORICAS_ALUNOS},
+    )
+    if not pd.api.types.is_numeric_dtype(tabela["ra"]):
+        tabela["ra"] = tabela["ra"].astype("category")
+    return tabela
+
+
+def codigo(serie, valor):
+    # código inteiro de ``valor`` na coluna categórica, -1 se ausente
+    return int(serie.cat.categories.get_indexer([valor])[0])
+
+
+def mascara_codigos(tabela, filtros):
+    # filtros de igualdade resolvidos em comparações de inteiros
+    mascara = np.ones(len(tabela), dtype=bool)
+    for coluna, valor in filtros.items():
+        serie = tabela[coluna]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            posicao = codigo(serie, valor)
+            if posicao < 0:
+                # valor fora do dicionário; o código -1 é reservado para NaN
+                mascara[:] = False
+                break
+            mascara &= serie.cat.codes.to_numpy() == posicao
+        else:
+            mascara &= serie.to_numpy() == valor
+    return mascara
+
+
+def gerar_rotulos(folha):
+    rotulos = {}
+    for dim in DIMENSOES[1:]:
+        valores = folha.index.get_level_values(dim).dropna().unique()
+        if dim in DIMENSOES_ROTULADAS:
+            rotulos[dim] = {valor: formatar_label(valor) for valor in valores}
+        else:
+            rotulos[dim] = {valor: valor for valor in valores}
+    return rotulos
+
+
+@dataclass
+class BaseVacinacao:
+    """Tudo o que os callbacks consultam, montado uma vez por carga de dados."""
+
+    cubo: CuboVacinas
+    indice: IndiceInvertido
+    series: SeriesAnuais
+    anos: list
+    rotulos: dict
+    versao: str
+    # estruturas derivadas montadas junto com a base (ex.: pacote clientside)
+    extras: dict = field(default_factory=dict)
+
+    @property
+    def ano_max(self):
+        return max(self.anos)
+
+
+def montar_base(folha, unidades, n_alunos, rotulos, versao, alunos_aproximado=False):
+    cubo = CuboVacinas(folha, unidades, n_alunos, alunos_aproximado=alunos_aproximado)
+    return base_do_cubo(cubo, rotulos, versao)
+
+
+def base_do_cubo(cubo, rotulos, versao):
+    # índice e séries derivados do cubo já montado (carga ou delta aplicado)
+    folha = cubo.cuboides[DIMENSOES]
+    anos = sorted(
+        int(ano) for ano in folha.index.get_level_values("data_vacinacao_ano").unique()
+    )
+    return BaseVacinacao(
+        cubo=cubo,
+        # listas de linhas por valor (CSR), usadas nos dropdowns em cascata
+        indice=IndiceInvertido(folha.index),
+        # matrizes ano a ano do painel de tendência
+        series=SeriesAnuais(cubo, anos),
+        anos=anos,
+        rotulos=rotulos,
+        versao=versao,
+    )
+
+
+def ler_arrow(caminho):
+    """Tabela Arrow de um arquivo do snapshot, lida por memory-map.
+
+    Abrir não copia nada, mas ``to_pandas()`` leva os dados para a memória do
+    processo, e o cubo, os conjuntos de alunos, o índice e as séries são
+    montados dessa cópia a cada carga: o snapshot só acelera a leitura dos
+    dados, não a montagem da base nem a memória de cada processo.
+    """
+    import pyarrow as pa
+
+    # o mapeamento fica aberto enquanto houver buffers da tabela em uso
+    return pa.ipc.open_file(pa.memory_map(str(caminho), "r")).read_all()
+
+
+def carregar_snapshot(pasta, alunos_aproximado=False):
+    # só a folha, as unidades e os alunos vêm prontos; os derivados são
+    # montados aqui como na carga dos CSVs
+    with open(pasta / MANIFESTO, "r", encoding="utf-8") as f:
+        manifesto = json.load(f)
+    folha = (
+        ler_arrow(pasta / "folha.arrow").to_pandas().set_index(list(DIMENSOES))
+    )
+    unidades = ler_arrow(pasta / "unidades.arrow").to_pandas().set_index(
+        "nome_unidade"
+    )
+    n_alunos = ler_arrow(pasta / "alunos.arrow").to_pandas()
+    return montar_base(
+        folha,
+        unidades,
+        n_alunos,
+        manifesto["rotulos"],
+        manifesto["versao"],
+        alunos_aproximado=alunos_aproximado,
+    )
+
+
+def _arquivos_dados(data_path):
+    manifesto = data_path / PASTA_SNAPSHOT / MANIFESTO
+    if manifesto.exists():
+        return [manifesto]
+    return [data_path / "n_vacinas_escola.csv", data_path / "n_alunos.csv"]
+
+
+def assinatura_dados(data_path):
+    # muda sempre que um novo snapshot ou extrato é gravado em ``data_path``
+    assinatura = []
+    for arquivo in _arquivos_dados(data_path):
+        try:
+            info = arquivo.stat()
+        except FileNotFoundError:
+            continue
+        assinatura.append((arquivo.name, info.st_mtime_ns, info.st_size))
+    return tuple(assinatura)
+
+
+def carregar_base(data_path, alunos_aproximado=False):
+    # snapshot gerado por ``python -m src.etl``; sem ele, lê os CSVs brutos
+    pasta = data_path / PASTA_SNAPSHOT
+    if (pasta / MANIFESTO).exists():
+        return carregar_snapshot(pasta, alunos_aproximado=alunos_aproximado)
+    versao = hashlib.sha1(repr(assinatura_dados(data_path)).encode()).hexdigest()
+    n_vacinas_escola = carregar_vacinas_escola(data_path / "n_vacinas_escola.csv")
+    n_alunos = carregar_alunos(data_path / "n_alunos.csv")
+    folha = agregar_folha(n_vacinas_escola)
+    return montar_base(
+        folha,
+        extrair_unidades(n_vacinas_escola),
+        n_alunos,
+        gerar_rotulos(folha),
+        versao=f"csv-{versao[:12]}",
+        alunos_aproximado=alunos_aproximado,
+    )
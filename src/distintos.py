@@ -0,0 +1,248 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+DIMENSOES_ALUNOS = ("tipo_unidade", "nome_unidade")
+
+# 2**14 registradores: erro padrão de ~0,8% e no máximo 16 KiB por unidade
+PRECISAO_HLL = 14
+# registrador ocupado guardado como ``posição << BITS_RANK | rank`` (uint32)
+BITS_RANK = 6
+
+
+def _ra_numerico(ra):
+    # RAs como int64, ou None se algum não for inteiro. Uma coluna com RA em
+    # branco é lida como float64: os valores inteiros continuam numéricos
+    if pd.api.types.is_integer_dtype(ra):
+        return ra.to_numpy(dtype="int64")
+    if pd.api.types.is_float_dtype(ra):
+        valores = ra.to_numpy(dtype="float64")
+        if np.all(np.isfinite(valores) & (valores == np.floor(valores))):
+            return valores.astype("int64")
+    return None
+
+
+def _codigos_ra(ra, conhecidos=None, numerico=None):
+    # RA numérico é usado como está; texto vira código inteiro (mesmo RA, mesmo
+    # código em todas as escolas, o que mantém a união correta). O esquema é
+    # decidido na carga (``numerico`` None) e mantido nos deltas: devolve
+    # também o dicionário de RAs em texto, que os deltas estendem sem
+    # renumerar (None no esquema numérico)
+    inteiros = _ra_numerico(ra)
+    if numerico is None:
+        numerico = inteiros is not None
+    if numerico:
+        if inteiros is None:
+            # códigos de texto colidiriam com RAs reais: o aluno sumiria
+            raise ValueError("RA em texto num conjunto de RAs numéricos")
+        return inteiros, None
+    # texto: RAs inteiros lidos como número viram o mesmo texto do extrato
+    if inteiros is not None:
+        ra = inteiros.astype(str)
+    ra = pd.Index(np.asarray(ra, dtype=str), dtype=object)
+    if conhecidos is None:
+        conhecidos = pd.Index([], dtype=object)
+    codigos = conhecidos.get_indexer(ra)
+    novos = ra[codigos < 0].unique()
+    conhecidos = conhecidos.append(novos)
+    codigos[codigos < 0] = conhecidos.get_indexer(ra[codigos < 0])
+    return codigos.astype("int64"), conhecidos
+
+
+def _misturar(valores):
+    # splitmix64: espalha os RAs sequenciais por todos os 64 bits
+    x = valores.astype("uint64") + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _bits(valores):
+    # número de bits significativos de cada uint64, exato (metades de 32 bits)
+    alto = (valores >> np.uint64(32)).astype("float64")
+    baixo = (valores & np.uint64(0xFFFFFFFF)).astype("float64")
+    return np.where(alto > 0, 32 + np.frexp(alto)[1], np.frexp(baixo)[1])
+
+
+def _estimar_hll(registradores):
+    m = registradores.shape[-1]
+    alfa = 0.7213 / (1 + 1.079 / m)
+    estimativa = alfa * m * m / np.sum(np.ldexp(1.0, -registradores.astype("int64")))
+    vazios = np.count_nonzero(registradores == 0)
+    if estimativa <= 2.5 * m and vazios:
+        # correção para cardinalidades pequenas (linear counting)
+        estimativa = m * np.log(m / vazios)
+    return int(round(estimativa))
+
+
+def _registradores_esparsos(chave, rank, m):
+    # maior rank de cada ``chave`` (folha * m + posição), em ordem de chave
+    ordem = np.lexsort((rank, chave))
+    chave, rank = chave[ordem], rank[ordem]
+    ultimo = np.append(chave[1:] != chave[:-1], True)
+    chave, rank = chave[ultimo], rank[ultimo]
+    pares = ((chave % m) << BITS_RANK | rank).astype("uint32")
+    return chave // m, pares
+
+
+def _densos(esparsos, m):
+    registradores = np.zeros(m, dtype="uint8")
+    posicao = (esparsos >> np.uint32(BITS_RANK)).astype("int64")
+    rank = (esparsos & np.uint32((1 << BITS_RANK) - 1)).astype("uint8")
+    np.maximum.at(registradores, posicao, rank)
+    return registradores
+
+
+class ConjuntosAlunos:
+    """Alunos distintos por unidade, montados uma única vez na carga.
+
+    Para cada par (``tipo_unidade``, ``nome_unidade``) guarda o conjunto de RAs
+    como array ordenado de inteiros (modo exato) ou os registradores de um
+    HyperLogLog (modo aproximado). Os recortes maiores são a união das folhas
+    (arrays concatenados e deduplicados, ou máximo dos registradores), então um
+    aluno que passou por várias escolas conta uma única vez e a consulta não
+    depende mais do número de linhas da tabela bruta.
+
+    No modo aproximado cada unidade guarda só os registradores ocupados
+    (uint32 com posição e rank) enquanto isso ocupa menos que os ``2**precisao``
+    bytes densos: a memória cresce com o número de alunos, como nos arrays
+    exatos, e fica limitada por unidade nas muito grandes.
+    """
+
+    def __init__(self, n_alunos, aproximado=False, precisao=PRECISAO_HLL):
+        self.aproximado = aproximado
+        self.precisao = precisao
+        n_alunos = n_alunos.dropna(subset=["ra"])
+        grupos = n_alunos.groupby(list(DIMENSOES_ALUNOS), observed=True)
+        self.folhas = pd.MultiIndex.from_tuples(
+            list(grupos.groups), names=list(DIMENSOES_ALUNOS)
+        )
+        self._niveis = {
+            dim: np.asarray(self.folhas.get_level_values(dim), dtype=object)
+            for dim in DIMENSOES_ALUNOS
+        }
+        folha = grupos.ngroup().to_numpy()
+        ra, self._ra_texto = _codigos_ra(n_alunos["ra"])
+        if aproximado:
+            self.conjuntos = self._registradores(folha, ra, len(self.folhas))
+        else:
+            self.conjuntos = self._arrays_ordenados(folha, ra, len(self.folhas))
+
+    @staticmethod
+    def _arrays_ordenados(folha, ra, n_folhas):
+        pares = np.unique(np.stack([folha, ra], axis=1), axis=0)
+        limites = np.searchsorted(pares[:, 0], np.arange(1, n_folhas))
+        tipo = "int32" if ra.size == 0 or ra.max() < 2**31 else "int64"
+        return [
+            conjunto.astype(tipo) for conjunto in np.split(pares[:, 1], limites)
+        ]
+
+    def _registradores(self, folha, ra, n_folhas):
+        m = 1 << self.precisao
+        resto = 64 - self.precisao
+        hashes = _misturar(ra)
+        posicao = (hashes >> np.uint64(resto)).astype("int64")
+        sufixo = hashes & np.uint64((1 << resto) - 1)
+        # posição do primeiro bit 1 nos bits que sobram
+        rank = (resto - _bits(sufixo) + 1).astype("int64")
+        folhas, pares = _registradores_esparsos(folha * m + posicao, rank, m)
+        limites = np.searchsorted(folhas, np.arange(1, n_folhas))
+        return [self._compactar(esparsos) for esparsos in np.split(pares, limites)]
+
+    def _compactar(self, esparsos):
+        # denso (uint8) só quando for menor que a lista de ocupados
+        m = 1 << self.precisao
+        if esparsos.nbytes < m:
+            return esparsos
+        return _densos(esparsos, m)
+
+    def _unir(self, conjuntos):
+        m = 1 << self.precisao
+        densos = [c for c in conjuntos if c.dtype == np.uint8]
+        esparsos = [c for c in conjuntos if c.dtype != np.uint8]
+        registradores = _densos(
+            np.concatenate(esparsos) if esparsos else np.empty(0, "uint32"), m
+        )
+        for denso in densos:
+            np.maximum(registradores, denso, out=registradores)
+        return registradores
+
+    def com_alunos(self, n_alunos):
+        """Cópia com os RAs de ``n_alunos`` acrescentados às suas unidades.
+
+        Só as unidades que receberam alunos ganham um conjunto novo (união do
+        array ordenado ou máximo dos registradores); as demais são as mesmas
+        do original, que não é alterado.
+        """
+        n_alunos = n_alunos.dropna(subset=["ra"])
+        if n_alunos.empty:
+            return self
+        novo = copy.copy(self)
+        chaves = pd.MultiIndex.from_frame(
+            n_alunos[list(DIMENSOES_ALUNOS)].astype(object)
+        )
+        novo.folhas = self.folhas.append(chaves.unique().difference(self.folhas))
+        novo._niveis = {
+            dim: np.asarray(novo.folhas.get_level_values(dim), dtype=object)
+            for dim in DIMENSOES_ALUNOS
+        }
+        folha = novo.folhas.get_indexer(chaves)
+        ra, novo._ra_texto = _codigos_ra(
+            n_alunos["ra"], self._ra_texto, numerico=self._ra_texto is None
+        )
+        n_novas = len(novo.folhas) - len(self.folhas)
+        if self.aproximado:
+            novo.conjuntos = self.conjuntos + [np.empty(0, "uint32")] * n_novas
+            acrescimos = self._registradores(folha, ra, len(novo.folhas))
+            for posicao in np.unique(folha):
+                registradores = self._unir(
+                    [novo.conjuntos[posicao], acrescimos[posicao]]
+                )
+                ocupados = np.flatnonzero(registradores)
+                novo.conjuntos[posicao] = self._compactar(
+                    (ocupados << BITS_RANK | registradores[ocupados]).astype("uint32")
+                )
+            return novo
+        novo.conjuntos = self.conjuntos + [np.empty(0, dtype="int32")] * n_novas
+        acrescimos = self._arrays_ordenados(folha, ra, len(novo.folhas))
+        for posicao in np.unique(folha):
+            novo.conjuntos[posicao] = np.union1d(
+                novo.conjuntos[posicao], acrescimos[posicao]
+            )
+        return novo
+
+    def _selecao(self, filtros):
+        selecao = np.ones(len(self.folhas), dtype=bool)
+        for dim, valor in filtros.items():
+            if isinstance(valor, (list, tuple, set)):
+                # vários valores: união (ex.: todas as escolas de uma área)
+                selecao &= np.isin(self._niveis[dim], list(valor))
+            else:
+                selecao &= self._niveis[dim] == valor
+        return np.flatnonzero(selecao)
+
+    def contar(self, **filtros):
+        # filtros por dimensão de DIMENSOES_ALUNOS (valor ou lista de valores);
+        # dimensão ausente = todas as unidades
+        posicoes = self._selecao(filtros)
+        if len(posicoes) == 0:
+            return 0
+        if self.aproximado:
+            return _estimar_hll(self._unir([self.conjuntos[i] for i in posicoes]))
+        if len(posicoes) == 1:
+            return len(self.conjuntos[posicoes[0]])
+        return len(np.unique(np.concatenate([self.conjuntos[i] for i in posicoes])))
+
+    def contagens(self, dims):
+        # uma contagem por combinação de valores de ``dims`` presente nas folhas
+        if not dims:
+            return self.contar()
+        chaves = self.folhas.droplevel(
+            [dim for dim in DIMENSOES_ALUNOS if dim not in dims]
+        ).unique()
+        contagens = {}
+        for chave in chaves:
+            valores = chave if isinstance(chave, tuple) else (chave,)
+            contagens[chave] = self.contar(**dict(zip(dims, valores)))
+        return contagens
@@ -0,0 +1,159 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+# largura de um tile do mapa em pixels (Web Mercator)
+PIXELS_TILE = 256
+# lado da célula de agrupamento, em pixels na tela
+PIXELS_AGRUPAMENTO = 60
+# a partir deste zoom os marcadores são sempre unidades individuais
+ZOOM_INDIVIDUAL = 13
+
+
+class IndiceEspacial:
+    """Grade regular sobre latitude/longitude das unidades, montada na carga.
+
+    Os pontos ficam ordenados por (linha, coluna) da grade, com o início de
+    cada célula num vetor de deslocamentos; numa consulta por retângulo, cada
+    linha de células vira um único intervalo contíguo do vetor ordenado e só
+    os pontos das células da borda precisam do teste exato.
+    """
+
+    def __init__(self, unidades: pd.DataFrame, tamanho_celula=0.005):
+        unidades = unidades.dropna(subset=["latitude", "longitude"])
+        self.nomes = unidades.index.to_numpy()
+        self.tamanho_celula = tamanho_celula
+        latitude = unidades["latitude"].to_numpy(dtype="float64")
+        longitude = unidades["longitude"].to_numpy(dtype="float64")
+        vazio = len(unidades) == 0
+        self.lat_min = 0.0 if vazio else latitude.min()
+        self.lon_min = 0.0 if vazio else longitude.min()
+        linhas = self._celula(latitude, self.lat_min)
+        colunas = self._celula(longitude, self.lon_min)
+        self.n_linhas = 1 if vazio else int(linhas.max()) + 1
+        self.n_colunas = 1 if vazio else int(colunas.max()) + 1
+
+        celulas = linhas * self.n_colunas + colunas
+        ordem = np.argsort(celulas, kind="stable")
+        self.ordem = ordem
+        self.latitude = latitude[ordem]
+        self.longitude = longitude[ordem]
+        self.inicios = np.searchsorted(
+            celulas[ordem], np.arange(self.n_linhas * self.n_colunas + 1)
+        )
+
+    def _celula(self, valores, minimo):
+        return np.floor((valores - minimo) / self.tamanho_celula).astype("int64")
+
+    def _intervalo(self, minimo, maximo, origem, n):
+        inicio = int(np.clip(self._celula(np.array(minimo), origem), 0, n - 1))
+        fim = int(np.clip(self._celula(np.array(maximo), origem), 0, n - 1))
+        return inicio, fim
+
+    def na_janela(self, lat_min, lat_max, lon_min, lon_max):
+        """Nomes das unidades dentro do retângulo (limites inclusivos)."""
+        if len(self.nomes) == 0:
+            return self.nomes
+        l0, l1 = self._intervalo(lat_min, lat_max, self.lat_min, self.n_linhas)
+        c0, c1 = self._intervalo(lon_min, lon_max, self.lon_min, self.n_colunas)
+        candidatos = [
+            np.arange(
+                self.inicios[linha * self.n_colunas + c0],
+                self.inicios[linha * self.n_colunas + c1 + 1],
+            )
+            for linha in range(l0, l1 + 1)
+        ]
+        candidatos = np.concatenate(candidatos)
+        lat = self.latitude[candidatos]
+        lon = self.longitude[candidatos]
+        dentro = (
+            (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+        )
+        return self.nomes[self.ordem[candidatos[dentro]]]
+
+
+def _graus_por_pixel(zoom):
+    return 360 / (PIXELS_TILE * 2**zoom)
+
+
+def janela_do_relayout(relayout, largura_px=1000, altura_px=600, margem=0.25):
+    """Retângulo visível (lat_min, lat_max, lon_min, lon_max) e zoom do mapa.
+
+    Usa os cantos que o plotly informa em ``map._derived``; sem eles, estima a
+    janela a partir de ``map.center`` e ``map.zoom`` e do tamanho do gráfico.
+    A ``margem`` (fração de cada lado) evita reconsultas em arrastes curtos.
+    Devolve ``None`` quando o evento não traz a posição do mapa.
+    """
+    if not relayout or "map.zoom" not in relayout:
+        return None
+    zoom = float(relayout["map.zoom"])
+    derivado = relayout.get("map._derived") or {}
+    if derivado.get("coordinates"):
+        lons, lats = zip(*derivado["coordinates"])
+        lat_min, lat_max, lon_min, lon_max = min(lats), max(lats), min(lons), max(lons)
+    elif "map.center" in relayout:
+        centro = relayout["map.center"]
+        meia_largura = largura_px / 2 * _graus_por_pixel(zoom)
+        # Mercator: na latitude do centro um grau de latitude ocupa mais pixels
+        escala_lat = math.cos(math.radians(centro["lat"]))
+        meia_altura = altura_px / 2 * _graus_por_pixel(zoom) * escala_lat
+        lat_min, lat_max = centro["lat"] - meia_altura, centro["lat"] + meia_altura
+        lon_min, lon_max = centro["lon"] - meia_largura, centro["lon"] + meia_largura
+    else:
+        return None
+    folga_lat = (lat_max - lat_min) * margem
+    folga_lon = (lon_max - lon_min) * margem
+    janela = (
+        lat_min - folga_lat,
+        lat_max + folga_lat,
+        lon_min - folga_lon,
+        lon_max + folga_lon,
+    )
+    return janela, zoom
+
+
+def agrupar_escolas(escolas, zoom):
+    """Agrupa os marcadores numa grade proporcional ao zoom.
+
+    Cada grupo soma ``n_vacinas`` e fica no centróide ponderado pelas vacinas;
+    grupos de uma única unidade continuam sendo a própria escola. A partir de
+    ``ZOOM_INDIVIDUAL`` nada é agrupado. A saída tem ``nome_unidade`` vazio
+    nos grupos e a coluna ``rotulo`` usada no hover.
+    """
+    nomes = escolas["nome_unidade"].astype(object)
+    escolas = escolas.assign(nome_unidade=nomes, rotulo=nomes, n_unidades=1)
+    if zoom >= ZOOM_INDIVIDUAL or len(escolas) < 2:
+        return escolas
+    lado_lon = PIXELS_AGRUPAMENTO * _graus_por_pixel(zoom)
+    lado_lat = lado_lon * math.cos(math.radians(escolas["latitude"].mean()))
+    peso = escolas["n_vacinas"].clip(lower=1)
+    grupos = (
+        escolas.assign(
+            linha=np.floor(escolas["latitude"] / lado_lat),
+            coluna=np.floor(escolas["longitude"] / lado_lon),
+            lat_peso=escolas["latitude"] * peso,
+            lon_peso=escolas["longitude"] * peso,
+            peso=peso,
+        )
+        .groupby(["linha", "coluna"])
+        .agg(
+            nome_unidade=("nome_unidade", "first"),
+            n_vacinas=("n_vacinas", "sum"),
+            n_unidades=("n_unidades", "sum"),
+            lat_peso=("lat_peso", "sum"),
+            lon_peso=("lon_peso", "sum"),
+            peso=("peso", "sum"),
+        )
+        .reset_index(drop=True)
+    )
+    grupos["latitude"] = grupos["lat_peso"] / grupos["peso"]
+    grupos["longitude"] = grupos["lon_peso"] / grupos["peso"]
+    agrupado = grupos["n_unidades"] > 1
+    grupos["rotulo"] = grupos["nome_unidade"].where(
+        ~agrupado, grupos["n_unidades"].astype(str) + " unidades"
+    )
+    grupos.loc[agrupado, "nome_unidade"] = ""
+    return grupos[
+        ["nome_unidade", "rotulo", "latitude", "longitude", "n_vacinas", "n_unidades"]
+    ]
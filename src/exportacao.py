@@ -0,0 +1,193 @@
+"""Exportação dos dados filtrados em CSV ou Parquet, por streaming.
+
+As aplicações são lidas em lotes de ``LINHAS_POR_LOTE`` linhas do snapshot
+(``vacinas.arrow``, aberto com memory-map; só o lote corrente é copiado) ou
+do extrato CSV, seguidos dos deltas pendentes; cada lote é filtrado,
+serializado e entregue antes do próximo ser lido, então a memória fica
+limitada ao lote qualquer que seja o tamanho do resultado. A tabela por escola
+já vem agregada do cubo e sai pelo mesmo caminho. Com workers ``gthread`` a
+transferência ocupa uma thread, não o worker inteiro.
+"""
+
+import csv
+import io
+from itertools import chain
+
+import pandas as pd
+
+from src.cubo import DIMENSOES, TODAS
+from src.dados import ANO_MINIMO, PASTA_SNAPSHOT, ler_arrow, mascara_codigos
+from src.incremental import listar_deltas
+
+LINHAS_POR_LOTE = 50_000
+
+# colunas exportadas do extrato (o RA dos alunos fica de fora)
+COLUNAS_APLICACOES = {
+    "data_vacinacao_ano": "int64",
+    "tipo_unidade": "string",
+    "modalidade": "string",
+    "nome_unidade": "string",
+    "latitude": "float64",
+    "longitude": "float64",
+    "vacina": "string",
+    "idade": "float64",
+    "n_vacinas": "int64",
+}
+COLUNAS_ESCOLAS = {
+    "nome_unidade": "string",
+    "latitude": "float64",
+    "longitude": "float64",
+    "n_vacinas": "int64",
+    "n_alunos": "int64",
+}
+
+FORMATOS = {
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def filtros_da_requisicao(argumentos):
+    """Filtros a partir da query string (mesmos nomes e valores dos callbacks)."""
+    filtros = {dim: argumentos.get(dim) or TODAS for dim in DIMENSOES}
+    ano = filtros["data_vacinacao_ano"]
+    if ano != TODAS:
+        try:
+            filtros["data_vacinacao_ano"] = int(ano)
+        except ValueError:
+            raise ValueError(f"ano inválido: {ano}") from None
+    return filtros
+
+
+def _filtrar(lote, fixados):
+    # mesmo corte de anos aplicado na carga do painel; as colunas de texto são
+    # categóricas nas duas fontes, então os filtros comparam códigos inteiros
+    mascara = lote["data_vacinacao_ano"].to_numpy() >= ANO_MINIMO
+    mascara &= mascara_codigos(lote, fixados)
+    return lote.loc[mascara, list(COLUNAS_APLICACOES)].astype(COLUNAS_APLICACOES)
+
+
+def _lotes_csv(caminho):
+    leitor = pd.read_csv(
+        caminho,
+        sep=";",
+        usecols=list(COLUNAS_APLICACOES),
+        dtype={
+            coluna: "category"
+            for coluna, tipo in COLUNAS_APLICACOES.items()
+            if tipo == "string"
+        },
+        chunksize=LINHAS_POR_LOTE,
+    )
+    with leitor:
+        yield from leitor
+
+
+def _lotes_arrow(caminho):
+    # só o lote corrente é convertido (copiado) para pandas
+    for lote in ler_arrow(caminho).to_batches(max_chunksize=LINHAS_POR_LOTE):
+        yield lote.to_pandas()
+
+
+def fontes_aplicacoes(data_path):
+    """Lotes de todas as aplicações: snapshot (ou extrato) e deltas pendentes.
+
+    ``None`` quando não há nenhuma das duas fontes.
+    """
+    snapshot = data_path / PASTA_SNAPSHOT / "vacinas.arrow"
+    extrato = data_path / "n_vacinas_escola.csv"
+    if snapshot.exists():
+        fontes = [_lotes_arrow(snapshot)]
+    elif extrato.exists():
+        fontes = [_lotes_csv(extrato)]
+    else:
+        return None
+    fontes += [_lotes_csv(delta) for delta in listar_deltas(data_path)]
+    return chain.from_iterable(fontes)
+
+
+def lotes_aplicacoes(fontes, filtros):
+    """Lotes das aplicações de ``fontes`` que casam com os filtros."""
+    fixados = {dim: valor for dim, valor in filtros.items() if valor != TODAS}
+    for lote in fontes:
+        lote = _filtrar(lote, fixados)
+        if len(lote):
+            yield lote
+
+
+def tabela_escolas(cubo, filtros):
+    """Vacinas e alunos distintos por escola da consulta.
+
+    Segue o mapa: sem ano selecionado ("Todas") não há escolas, em vez da
+    soma de todos os anos que o painel não mostra.
+    """
+    escolas = cubo.por_escola(filtros)
+    if filtros["data_vacinacao_ano"] == TODAS:
+        escolas = escolas.head(0)
+    escolas["n_alunos"] = [
+        cubo.n_alunos(escola, filtros["tipo_unidade"])
+        for escola in escolas["nome_unidade"]
+    ]
+    return escolas[list(COLUNAS_ESCOLAS)].astype(COLUNAS_ESCOLAS)
+
+
+def em_lotes(tabela):
+    for inicio in range(0, len(tabela), LINHAS_POR_LOTE):
+        yield tabela.iloc[inicio : inicio + LINHAS_POR_LOTE]
+
+
+def gerar_csv(lotes, colunas):
+    """Bytes do CSV (``;`` como no extrato), um pedaço por lote."""
+    buffer = io.StringIO()
+    csv.writer(buffer, delimiter=";", lineterminator="\n").writerow(colunas)
+    yield buffer.getvalue().encode("utf-8")
+    for lote in lotes:
+        yield lote.to_csv(sep=";", index=False, header=False).encode("utf-8")
+
+
+class _Saida(io.RawIOBase):
+    # destino do ParquetWriter que só acumula o que foi escrito desde a última
+    # retirada; nada além de um row group fica em memória
+    def __init__(self):
+        self.partes = []
+        self.posicao = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self.posicao
+
+    def retirar(self):
+        partes, self.partes = self.partes, []
+        return b"".join(partes)
+
+
+def gerar_parquet(lotes, colunas):
+    """Bytes do Parquet, um row group por lote."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tipos = {"string": pa.string(), "float64": pa.float64(), "int64": pa.int64()}
+    esquema = pa.schema([(coluna, tipos[tipo]) for coluna, tipo in colunas.items()])
+    saida = _Saida()
+    with pq.ParquetWriter(saida, esquema, compression="zstd") as escritor:
+        for lote in lotes:
+            escritor.write_table(
+                pa.Table.from_pandas(lote, schema=esquema, preserve_index=False)
+            )
+            yield saida.retirar()
+    # rodapé com os metadados dos row groups, escrito ao fechar
+    yield saida.retirar()
+
+
+def exportar(lotes, colunas, formato):
+    """Gerador de bytes de ``lotes`` no formato pedido (``csv`` ou ``parquet``)."""
+    if formato == "csv":
+        return gerar_csv(lotes, list(colunas))
+    return gerar_parquet(lotes, colunas)
@@ -0,0 +1,77 @@
+import hashlib
+import json
+
+import numpy as np
+
+
+def simplificar_linha(pontos, tolerancia):
+    # Douglas–Peucker iterativo; ``tolerancia`` na unidade das coordenadas
+    pontos = np.asarray(pontos, dtype="float64")
+    if tolerancia <= 0 or len(pontos) < 3:
+        return pontos
+    manter = np.zeros(len(pontos), dtype=bool)
+    manter[[0, -1]] = True
+    pilha = [(0, len(pontos) - 1)]
+    while pilha:
+        inicio, fim = pilha.pop()
+        if fim - inicio < 2:
+            continue
+        a, b = pontos[inicio], pontos[fim]
+        meio = pontos[inicio + 1 : fim]
+        segmento = b - a
+        comprimento = np.hypot(*segmento)
+        if comprimento == 0:
+            distancias = np.hypot(*(meio - a).T)
+        else:
+            vetores = meio - a
+            distancias = (
+                np.abs(segmento[0] * vetores[:, 1] - segmento[1] * vetores[:, 0])
+                / comprimento
+            )
+        maior = int(np.argmax(distancias))
+        if distancias[maior] > tolerancia:
+            indice = inicio + 1 + maior
+            manter[indice] = True
+            pilha.append((inicio, indice))
+            pilha.append((indice, fim))
+    return pontos[manter]
+
+
+def _simplificar_anel(anel, tolerancia):
+    simplificado = simplificar_linha(anel, tolerancia)
+    # um anel de polígono precisa de ao menos 4 posições (fechado)
+    if len(simplificado) < 4:
+        return anel
+    return simplificado.tolist()
+
+
+def simplificar_geojson(geojson, tolerancia):
+    if tolerancia <= 0:
+        return geojson
+    for feature in geojson["features"]:
+        geometria = feature["geometry"]
+        if geometria["type"] == "Polygon":
+            geometria["coordinates"] = [
+                _simplificar_anel(anel, tolerancia) for anel in geometria["coordinates"]
+            ]
+        elif geometria["type"] == "MultiPolygon":
+            geometria["coordinates"] = [
+                [_simplificar_anel(anel, tolerancia) for anel in poligono]
+                for poligono in geometria["coordinates"]
+            ]
+    return geojson
+
+
+class GeojsonEstatico:
+    """GeoJSON lido e serializado uma única vez, servido por URL versionada.
+
+    A versão é o hash do conteúdo já simplificado, então a URL muda sempre que
+    o arquivo ou a tolerância mudam e pode ser cacheada indefinidamente.
+    """
+
+    def __init__(self, caminho, tolerancia=0.0):
+        with open(caminho, "r", encoding="utf-8") as f:
+            self.geojson = simplificar_geojson(json.load(f), tolerancia)
+        self.conteudo = json.dumps(self.geojson, separators=(",", ":")).encode()
+        self.versao = hashlib.sha1(self.conteudo).hexdigest()[:12]
+        self.nome_arquivo = f"{caminho.stem}.{self.versao}.geojson"
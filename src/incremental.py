@@ -0,0 +1,135 @@
+"""Ingestão incremental dos extratos diários (deltas).
+
+Cada delta é um CSV em ``data/deltas/`` com as colunas de
+``n_vacinas_escola.csv``: registros novos com ``n_vacinas`` positivo e, para
+corrigir um registro, o estorno dele (mesmas colunas, ``n_vacinas`` negativo)
+seguido do registro corrigido. Os alunos das aplicações novas vão num arquivo
+de mesmo nome em ``data/deltas/alunos/``, com as colunas de ``n_alunos.csv``
+(opcional quando o delta só tem estornos; um estorno não tira o aluno da
+unidade) e deve ser copiado antes do delta. Os deltas são aplicados em ordem
+de nome (ex.: ``2026-10-17.csv``) sobre a base em memória, sem reler o
+histórico; de tempos em tempos ``python -m src.etl --compactar`` os incorpora
+ao snapshot. Um extrato completo novo já contém os deltas anteriores: ao
+publicá-lo, esvazie ``data/deltas``.
+"""
+
+import hashlib
+import json
+
+import pandas as pd
+
+from src.cubo import DIMENSOES, agregar_folha, extrair_unidades
+from src.dados import (
+    MANIFESTO,
+    PASTA_SNAPSHOT,
+    base_do_cubo,
+    carregar_alunos,
+    carregar_vacinas_escola,
+    gerar_rotulos,
+)
+
+PASTA_DELTAS = "deltas"
+# alunos de cada delta, no arquivo de mesmo nome
+PASTA_ALUNOS = "alunos"
+COLUNAS_ALUNOS = ["tipo_unidade", "nome_unidade", "ra"]
+
+
+def deltas_compactados(data_path):
+    # deltas já incorporados ao snapshot atual, registrados no manifesto
+    manifesto = data_path / PASTA_SNAPSHOT / MANIFESTO
+    if not manifesto.exists():
+        return set()
+    with open(manifesto, "r", encoding="utf-8") as f:
+        return set(json.load(f).get("deltas", []))
+
+
+def listar_deltas(data_path):
+    """Deltas ainda não compactados, na ordem em que devem ser aplicados."""
+    compactados = deltas_compactados(data_path)
+    return sorted(
+        arquivo
+        for arquivo in (data_path / PASTA_DELTAS).glob("*.csv")
+        if arquivo.name not in compactados
+    )
+
+
+def alunos_do_delta(caminho):
+    return caminho.parent / PASTA_ALUNOS / caminho.name
+
+
+def _assinatura_arquivo(caminho):
+    try:
+        info = caminho.stat()
+    except FileNotFoundError:
+        return None
+    return info.st_mtime_ns, info.st_size
+
+
+def assinatura_deltas(data_path):
+    # como ``assinatura_dados``: muda quando um delta (ou o arquivo de alunos
+    # dele) chega ou é reescrito
+    assinatura = []
+    for arquivo in listar_deltas(data_path):
+        info = _assinatura_arquivo(arquivo)
+        if info is None:
+            continue
+        assinatura.append(
+            (arquivo.name, *info, _assinatura_arquivo(alunos_do_delta(arquivo)))
+        )
+    return tuple(assinatura)
+
+
+def carregar_deltas(caminhos):
+    return pd.concat(
+        [carregar_vacinas_escola(caminho) for caminho in caminhos], ignore_index=True
+    )
+
+
+def carregar_alunos_deltas(caminhos):
+    """Alunos dos deltas em ``caminhos`` (vazio se nenhum tiver o arquivo)."""
+    tabelas = []
+    for caminho in caminhos:
+        arquivo = alunos_do_delta(caminho)
+        if not arquivo.exists():
+            continue
+        colunas = pd.read_csv(arquivo, sep=";", nrows=0).columns
+        faltando = set(COLUNAS_ALUNOS) - set(colunas)
+        if faltando:
+            raise ValueError(
+                f"{arquivo}: colunas ausentes: {', '.join(sorted(faltando))}"
+            )
+        tabelas.append(carregar_alunos(arquivo)[COLUNAS_ALUNOS])
+    if not tabelas:
+        return pd.DataFrame(columns=COLUNAS_ALUNOS)
+    return pd.concat(tabelas, ignore_index=True)
+
+
+def unidades_com_delta(unidades, delta):
+    # unidades novas entram no fim; as existentes mantêm as coordenadas
+    novas = extrair_unidades(delta)
+    return pd.concat([unidades, novas[~novas.index.isin(unidades.index)]])
+
+
+def aplicar_deltas(base, caminhos):
+    """Nova ``BaseVacinacao`` com os deltas em ``caminhos`` somados à ``base``.
+
+    Só os deltas são lidos: o cubo soma a agregação deles a cada cuboide e os
+    conjuntos de alunos recebem os RAs novos; índice, séries e rótulos são
+    refeitos a partir da folha já agregada. A ``base`` não é alterada.
+    """
+    if not caminhos:
+        return base
+    delta = carregar_deltas(caminhos)
+    cubo = base.cubo.com_delta(
+        agregar_folha(delta),
+        unidades_com_delta(base.cubo.unidades, delta),
+        carregar_alunos_deltas(caminhos),
+    )
+    assinatura = [base.versao]
+    for caminho in caminhos:
+        alunos = _assinatura_arquivo(alunos_do_delta(caminho))
+        assinatura.append(f"{caminho.name}:{_assinatura_arquivo(caminho)}:{alunos}")
+    versao = hashlib.sha1(" ".join(assinatura).encode()).hexdigest()[:12]
+    return base_do_cubo(
+        cubo, gerar_rotulos(cubo.cuboides[DIMENSOES]), versao=f"delta-{versao}"
+    )
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+from src.cubo import DIMENSOES, TODAS
+
+
+class IndiceInvertido:
+    """Índice invertido das combinações existentes de filtros.
+
+    Cada linha da folha do cubo (combinação observada das cinco dimensões)
+    ocupa uma posição. Para cada dimensão guarda-se o código do valor em cada
+    linha e as listas de linhas de cada valor em formato CSR (linhas agrupadas
+    por valor e o início de cada grupo), tudo em int32: a memória cresce com o
+    número de linhas, não com linhas × valores distintos. A seleção parte da
+    lista mais curta entre os filtros e descarta as linhas cujos códigos não
+    batem com os demais; as opções de uma dimensão são os códigos presentes
+    nas linhas selecionadas.
+    """
+
+    def __init__(self, combinacoes: pd.MultiIndex):
+        self.n_linhas = len(combinacoes)
+        self.opcoes = {}
+        self.codigos = {}
+        self._posicoes = {}
+        self._linhas = {}
+        self._inicios = {}
+        for dim in DIMENSOES:
+            nivel = combinacoes.names.index(dim)
+            codigos = np.asarray(combinacoes.codes[nivel])
+            valores = combinacoes.levels[nivel]
+            # códigos renumerados na ordem dos valores; valores sem nenhuma
+            # linha e em branco não viram opção. O groupby(dropna=False) da
+            # folha guarda o NaN como um nível, não como o código -1
+            usados = np.unique(codigos[codigos >= 0])
+            presentes = sorted(
+                (i for i in usados if not pd.isna(valores[i])),
+                key=lambda i: valores[i],
+            )
+            renumeracao = np.full(len(valores), -1, dtype="int32")
+            renumeracao[presentes] = np.arange(len(presentes), dtype="int32")
+            # linhas em branco passam a ter código -1, como as sem nível
+            codigos = np.where(codigos >= 0, renumeracao[codigos], -1).astype("int32")
+            self.opcoes[dim] = [valores[i] for i in presentes]
+            self._posicoes[dim] = {valor: i for i, valor in enumerate(self.opcoes[dim])}
+            self.codigos[dim] = codigos
+            # linhas sem valor (-1) ficam antes do primeiro grupo
+            self._linhas[dim] = np.argsort(codigos, kind="stable").astype("int32")
+            contagens = np.bincount(codigos[codigos >= 0], minlength=len(presentes))
+            self._inicios[dim] = np.count_nonzero(codigos < 0) + np.concatenate(
+                [[0], np.cumsum(contagens)]
+            )
+
+    def _lista(self, dim, codigo):
+        inicios = self._inicios[dim]
+        return self._linhas[dim][inicios[codigo] : inicios[codigo + 1]]
+
+    def selecao(self, filtros, ignorar=()):
+        """Linhas compatíveis com os filtros; ``None`` quando são todas."""
+        fixados = []
+        for dim, valor in filtros.items():
+            if valor == TODAS or dim in ignorar:
+                continue
+            codigo = self._posicoes[dim].get(valor)
+            if codigo is None:
+                return np.empty(0, dtype="int32")
+            fixados.append((dim, codigo))
+        if not fixados:
+            return None
+        menor = min(fixados, key=lambda fixado: len(self._lista(*fixado)))
+        linhas = self._lista(*menor)
+        for dim, codigo in fixados:
+            if (dim, codigo) != menor and len(linhas):
+                linhas = linhas[self.codigos[dim][linhas] == codigo]
+        return linhas
+
+    def valores(self, dimensao, filtros):
+        # valores distintos de ``dimensao`` compatíveis com os demais filtros
+        linhas = self.selecao(filtros, ignorar=(dimensao,))
+        if linhas is None:
+            return list(self.opcoes[dimensao])
+        codigos = self.codigos[dimensao][linhas]
+        contagens = np.bincount(
+            codigos[codigos >= 0], minlength=len(self.opcoes[dimensao])
+        )
+        opcoes = self.opcoes[dimensao]
+        return [opcoes[i] for i in np.flatnonzero(contagens)]
@@ -0,0 +1,221 @@
+import cProfile
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from flask import g, has_request_context, request
+
+# limites (em segundos e em bytes) dos histogramas
+BALDES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BALDES_BYTES = (1_000, 5_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000)
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _formatar_rotulos(rotulos, extra=()):
+    pares = [*rotulos, *extra]
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + "}"
+
+
+class Histograma:
+    def __init__(self, nome, ajuda, baldes):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.baldes = baldes
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        with self._lock:
+            serie = self._series.setdefault(
+                chave, {"baldes": [0] * len(self.baldes), "soma": 0.0, "contagem": 0}
+            )
+            for i, limite in enumerate(self.baldes):
+                if valor <= limite:
+                    serie["baldes"][i] += 1
+            serie["soma"] += valor
+            serie["contagem"] += 1
+
+    def exportar(self):
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        with self._lock:
+            series = {chave: dict(serie) for chave, serie in self._series.items()}
+        for rotulos, serie in sorted(series.items()):
+            # baldes cumulativos: a observação conta em todo ``le`` >= valor
+            for limite, n in zip(self.baldes, serie["baldes"]):
+                sufixo = _formatar_rotulos(rotulos, [("le", limite)])
+                linhas.append(f"{self.nome}_bucket{sufixo} {n}")
+            sufixo = _formatar_rotulos(rotulos, [("le", "+Inf")])
+            linhas.append(f"{self.nome}_bucket{sufixo} {serie['contagem']}")
+            sufixo = _formatar_rotulos(rotulos)
+            linhas.append(f"{self.nome}_sum{sufixo} {serie['soma']}")
+            linhas.append(f"{self.nome}_count{sufixo} {serie['contagem']}")
+        return linhas
+
+
+@contextmanager
+def fase(nome):
+    """Cronometra um trecho do callback em andamento (no-op fora de requisição)."""
+    if not has_request_context():
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        fases = g.setdefault("painel_fases", {})
+        fases[nome] = fases.get(nome, 0.0) + time.perf_counter() - inicio
+
+
+def anotar(**rotulos):
+    # rótulos extras da requisição atual (ex.: status do cache); só valores de
+    # um conjunto fixo, cada combinação vira uma série nova nos histogramas
+    if has_request_context():
+        g.setdefault("painel_rotulos", {}).update(rotulos)
+
+
+class MetricasCallbacks:
+    """Latência, fases e tamanho das respostas dos callbacks do Dash.
+
+    Os ganchos do Flask envolvem ``_dash-update-component``: o tempo total vai
+    do início da requisição até a resposta pronta, então inclui a serialização
+    JSON feita pelo Dash; a fase ``serializacao`` é o que sobra depois das fases
+    marcadas com ``fase()`` dentro do callback. Os valores são do processo que
+    atendeu: com vários workers, cada um expõe os seus.
+
+    ``versoes`` devolve a versão dos dados de cada município em memória,
+    exposta como ``painel_dados_info`` no momento da coleta: a versão não é
+    rótulo dos histogramas, que ganhariam séries novas a cada recarga.
+
+    Com ``limiar_perfil`` > 0, uma fração ``amostra_perfil`` das chamadas roda
+    sob ``cProfile`` e o perfil é gravado em ``pasta_perfil`` quando a chamada
+    passa do limiar.
+    """
+
+    def __init__(
+        self,
+        app,
+        cache=None,
+        limiar_perfil=0.0,
+        amostra_perfil=0.05,
+        pasta_perfil="perfis",
+        versoes=None,
+    ):
+        self.app = app
+        self.cache = cache
+        self.versoes = versoes
+        self.limiar_perfil = limiar_perfil
+        self.amostra_perfil = amostra_perfil
+        self.pasta_perfil = Path(pasta_perfil)
+        self.duracao = Histograma(
+            "painel_callback_duracao_segundos",
+            "Tempo total de cada chamada de callback",
+            BALDES_SEGUNDOS,
+        )
+        self.fases = Histograma(
+            "painel_callback_fase_segundos",
+            "Tempo de cada fase dos callbacks",
+            BALDES_SEGUNDOS,
+        )
+        self.bytes = Histograma(
+            "painel_callback_resposta_bytes",
+            "Tamanho do corpo da resposta dos callbacks",
+            BALDES_BYTES,
+        )
+        self.rota = f"{app.config.routes_pathname_prefix}_dash-update-component"
+        servidor = app.server
+        servidor.before_request(self._antes)
+        servidor.after_request(self._depois)
+
+    def _nome_callback(self):
+        corpo = request.get_json(silent=True) or {}
+        entrada = self.app.callback_map.get(corpo.get("output"), {})
+        funcao = entrada.get("callback")
+        return getattr(funcao, "__name__", corpo.get("output", "desconhecido"))
+
+    def _antes(self):
+        if request.path != self.rota:
+            return
+        g.painel_inicio = time.perf_counter()
+        if self.limiar_perfil > 0 and random.random() < self.amostra_perfil:
+            perfil = cProfile.Profile()
+            try:
+                perfil.enable()
+            except ValueError:
+                # outro profiler já ativo neste processo
+                return
+            g.painel_perfil = perfil
+
+    def _depois(self, resposta):
+        inicio = g.pop("painel_inicio", None)
+        if inicio is None:
+            return resposta
+        duracao = time.perf_counter() - inicio
+        perfil = g.pop("painel_perfil", None)
+        if perfil is not None:
+            perfil.disable()
+
+        callback = self._nome_callback()
+        rotulos = {"cache": "desligado"}
+        rotulos.update(g.pop("painel_rotulos", {}))
+        self.duracao.observar(duracao, callback=callback, **rotulos)
+        fases = g.pop("painel_fases", {})
+        for nome, segundos in fases.items():
+            self.fases.observar(segundos, callback=callback, fase=nome)
+        self.fases.observar(
+            max(duracao - sum(fases.values()), 0.0),
+            callback=callback,
+            fase="serializacao",
+        )
+        if not resposta.is_streamed:
+            self.bytes.observar(resposta.calculate_content_length(), callback=callback)
+
+        if perfil is not None and duracao >= self.limiar_perfil:
+            self._gravar_perfil(perfil, callback, duracao)
+        return resposta
+
+    def _gravar_perfil(self, perfil, callback, duracao):
+        self.pasta_perfil.mkdir(parents=True, exist_ok=True)
+        carimbo = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        perfil.dump_stats(
+            self.pasta_perfil / f"{callback}-{carimbo}-{duracao * 1000:.0f}ms.prof"
+        )
+
+    def exportar(self):
+        linhas = [
+            *self.duracao.exportar(),
+            *self.fases.exportar(),
+            *self.bytes.exportar(),
+        ]
+        if self.cache is not None:
+            estatisticas = self.cache.estatisticas()
+            for nome in ("acertos", "falhas", "despejos"):
+                metrica = f"painel_cache_{nome}_total"
+                linhas += [
+                    f"# TYPE {metrica} counter",
+                    f"{metrica} {estatisticas[nome]}",
+                ]
+            linhas += [
+                "# TYPE painel_cache_entradas gauge",
+                f"painel_cache_entradas {estatisticas['entradas']}",
+            ]
+        if self.versoes is not None:
+            # uma série por município, com a versão atual sobrescrita no lugar
+            linhas += [
+                "# HELP painel_dados_info Versão dos dados em uso",
+                "# TYPE painel_dados_info gauge",
+            ]
+            for municipio, versao in sorted(self.versoes().items()):
+                sufixo = _formatar_rotulos(
+                    [("municipio", municipio), ("versao", versao)]
+                )
+                linhas.append(f"painel_dados_info{sufixo} 1")
+        return "\n".join(linhas) + "\n"
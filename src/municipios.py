@@ -0,0 +1,307 @@
+"""Partições por município, carregadas sob demanda.
+
+Cada município tem a própria pasta (extratos, snapshot e deltas, como em
+``data/``) e a geometria em ``municipio.geojson``; ``municipios.json`` na raiz
+dá o nome exibido de cada pasta. Gerar as partições a partir de um extrato
+estadual::
+
+    python -m src.municipios --origem data --destino data/municipios \\
+        --camada sp_municipios.geojson
+
+``--camada`` é a malha dos municípios em GeoJSON (ex.: ``SP_Municipios_2023``
+convertido com ``ogr2ogr -f GeoJSON``); cada escola vai para o município que
+contém as suas coordenadas.
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.areas import CamadaAreas
+from src.utils import formatar_label
+
+logger = logging.getLogger(__name__)
+
+ARQUIVO_GEOMETRIA = "municipio.geojson"
+ARQUIVO_INDICE = "municipios.json"
+LINHAS_POR_LOTE = 200_000
+
+# altura do mapa em pixels: o zoom derivado enquadra o município nela
+ALTURA_MAPA = 600
+
+
+@dataclass
+class Municipio:
+    codigo: str
+    nome: str
+    pasta: Path
+    geometria: Path
+    # enquadramento fixo; None deriva da geometria
+    centro: dict = None
+    zoom: float = None
+
+
+@dataclass
+class Particao:
+    """Um município residente: dados com recarga, geometria e enquadramento."""
+
+    municipio: Municipio
+    dados: object
+    geojson: object
+    centro: dict
+    zoom: float
+    # estruturas por município montadas pelo app (ex.: camada de áreas)
+    extras: dict = field(default_factory=dict)
+
+
+def codigo_municipio(nome):
+    # "São Paulo" → "sao-paulo": nome de pasta e valor estável para URLs
+    ascii_ = unicodedata.normalize("NFKD", nome).encode("ascii", "ignore").decode()
+    return "-".join("".join(c if c.isalnum() else " " for c in ascii_).lower().split())
+
+
+def descobrir_municipios(pasta):
+    """Municípios com partição em ``pasta``, na ordem dos nomes."""
+    indice = pasta / ARQUIVO_INDICE
+    nomes = {}
+    if indice.exists():
+        with open(indice, "r", encoding="utf-8") as f:
+            nomes = json.load(f)
+    municipios = [
+        Municipio(
+            codigo=sub.name,
+            nome=nomes.get(sub.name) or formatar_label(sub.name.replace("-", " ")),
+            pasta=sub,
+            geometria=sub / ARQUIVO_GEOMETRIA,
+        )
+        for sub in pasta.iterdir()
+        if (sub / ARQUIVO_GEOMETRIA).exists()
+    ]
+    return sorted(municipios, key=lambda municipio: municipio.nome)
+
+
+def enquadramento(geojson, altura=ALTURA_MAPA):
+    """Centro e zoom que enquadram a geometria num mapa de ``altura`` pixels."""
+    pontos = np.concatenate(
+        [
+            np.asarray(anel, dtype="float64")[:, :2]
+            for feature in geojson["features"]
+            for poligono in (
+                [feature["geometry"]["coordinates"]]
+                if feature["geometry"]["type"] == "Polygon"
+                else feature["geometry"]["coordinates"]
+            )
+            for anel in poligono
+        ]
+    )
+    (lon_min, lat_min), (lon_max, lat_max) = pontos.min(axis=0), pontos.max(axis=0)
+    centro = dict(lat=float(lat_min + lat_max) / 2, lon=float(lon_min + lon_max) / 2)
+    # extensão em graus de longitude equivalentes (Mercator na latitude central)
+    extensao = max(
+        lon_max - lon_min, (lat_max - lat_min) / math.cos(math.radians(centro["lat"]))
+    )
+    if extensao <= 0:
+        return centro, 12
+    # tiles de 256 px cobrem 360° no zoom 0; um nível a menos deixa margem
+    zoom = math.floor(math.log2(altura * 360 / (256 * extensao))) - 1
+    return centro, max(1, min(zoom, 15))
+
+
+class Municipios:
+    """Municípios disponíveis e LRU das partições residentes.
+
+    A partição é montada por ``criar_particao`` no primeiro acesso ao município
+    e fica residente até ser a menos usada com ``residentes`` partições já em
+    memória; requisições em curso continuam com a referência que obtiveram.
+    Uma única thread verifica novos dados das partições residentes e pode
+    avisar ``ao_recarregar`` (ex.: o master do gunicorn reciclando os workers).
+    """
+
+    def __init__(self, municipios, criar_particao, residentes=4):
+        self.municipios = {municipio.codigo: municipio for municipio in municipios}
+        self.residentes = max(1, residentes)
+        self._criar_particao = criar_particao
+        self._particoes = OrderedDict()
+        self._carregando = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        # a thread de recarga pode estar com a trava quando o master do
+        # gunicorn cria um worker; o fork espera e o filho nasce com ela livre
+        os.register_at_fork(
+            before=self._lock.acquire,
+            after_in_parent=self._lock.release,
+            after_in_child=self._lock.release,
+        )
+
+    def __contains__(self, codigo):
+        return codigo in self.municipios
+
+    def _residente(self, codigo):
+        with self._lock:
+            particao = self._particoes.get(codigo)
+            if particao is not None:
+                self._particoes.move_to_end(codigo)
+            return particao
+
+    def obter(self, codigo):
+        particao = self._residente(codigo)
+        if particao is not None:
+            return particao
+        municipio = self.municipios[codigo]
+        with self._lock:
+            trava = self._carregando.setdefault(codigo, threading.Lock())
+        # uma carga por município; os demais continuam atendidos enquanto isso
+        with trava:
+            particao = self._residente(codigo)
+            if particao is not None:
+                return particao
+            particao = self._criar_particao(municipio)
+            with self._lock:
+                self._particoes[codigo] = particao
+                while len(self._particoes) > self.residentes:
+                    despejado, _ = self._particoes.popitem(last=False)
+                    logger.info("partição %s liberada", despejado)
+        logger.info("partição %s carregada", codigo)
+        return particao
+
+    def particoes(self):
+        with self._lock:
+            return list(self._particoes.values())
+
+    def verificar(self, ignorar=()):
+        """Recarrega as partições residentes com dados novos (fora ``ignorar``).
+
+        Devolve se alguma foi recarregada.
+        """
+        recarregou = False
+        for particao in self.particoes():
+            if particao.municipio.codigo in ignorar:
+                continue
+            try:
+                recarregou |= particao.dados.verificar()
+            except Exception:
+                # extrato inválido: mantém a versão atual e tenta de novo depois
+                logger.exception(
+                    "falha ao recarregar dados de %s", particao.municipio.codigo
+                )
+        return recarregou
+
+    def _monitorar(self, intervalo, ignorar, ao_recarregar):
+        evento = threading.Event()
+        while not evento.wait(intervalo):
+            if self.verificar(ignorar) and ao_recarregar is not None:
+                ao_recarregar()
+
+    def iniciar_monitoramento(self, intervalo, ignorar=(), ao_recarregar=None):
+        if intervalo <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(
+            target=self._monitorar,
+            args=(intervalo, frozenset(ignorar), ao_recarregar),
+            name="recarga-municipios",
+            daemon=True,
+        )
+        self._thread.start()
+
+
+def particionar(origem, destino, caminho_camada, campo="NM_MUN"):
+    """Divide os extratos de ``origem`` em uma pasta por município."""
+    camada = CamadaAreas(caminho_camada, campo)
+    with open(caminho_camada, "r", encoding="utf-8") as f:
+        features = json.load(f)["features"]
+    destino.mkdir(parents=True, exist_ok=True)
+
+    # município de cada ponto, decidido uma vez; escolas homônimas de cidades
+    # diferentes ficam separadas porque a decisão é pelas coordenadas
+    municipio_ponto = {}
+    pares = set()
+    leitor = pd.read_csv(
+        origem / "n_vacinas_escola.csv", sep=";", chunksize=LINHAS_POR_LOTE
+    )
+    with leitor:
+        for lote in leitor:
+            lote = lote.dropna(subset=["longitude", "latitude"])
+            pontos = list(zip(lote["longitude"], lote["latitude"]))
+            novos = [p for p in dict.fromkeys(pontos) if p not in municipio_ponto]
+            if novos:
+                lon, lat = np.array(novos).T
+                municipio_ponto.update(zip(novos, camada.atribuir(lon, lat)))
+            por_municipio = pd.Series(
+                [municipio_ponto[p] for p in pontos], index=lote.index, dtype=object
+            )
+            for nome, linhas in lote.groupby(por_municipio, sort=False):
+                codigo = codigo_municipio(nome)
+                _anexar(destino / codigo / "n_vacinas_escola.csv", linhas)
+                pares.update(
+                    (escola, nome) for escola in linhas["nome_unidade"].unique()
+                )
+
+    # n_alunos não tem coordenadas: cada aluno vai para os municípios em que o
+    # nome da unidade aparece nas aplicações (unidades sem aplicações ficam fora)
+    escolas = pd.DataFrame(sorted(pares), columns=["nome_unidade", "municipio"])
+    leitor = pd.read_csv(origem / "n_alunos.csv", sep=";", chunksize=LINHAS_POR_LOTE)
+    with leitor:
+        for lote in leitor:
+            lote = lote.merge(escolas, on="nome_unidade")
+            for nome, linhas in lote.groupby("municipio", sort=False):
+                _anexar(
+                    destino / codigo_municipio(nome) / "n_alunos.csv",
+                    linhas.drop(columns="municipio"),
+                )
+
+    indice = {}
+    for nome in sorted(set(escolas["municipio"])):
+        codigo = codigo_municipio(nome)
+        indice[codigo] = nome
+        if not (destino / codigo / "n_alunos.csv").exists():
+            # município só com aplicações: arquivo de alunos vazio, com cabeçalho
+            _anexar(
+                destino / codigo / "n_alunos.csv",
+                pd.DataFrame(columns=["tipo_unidade", "nome_unidade", "ra"]),
+            )
+        geometria = {
+            "type": "FeatureCollection",
+            "features": [f for f in features if f["properties"].get(campo) == nome],
+        }
+        with open(destino / codigo / ARQUIVO_GEOMETRIA, "w", encoding="utf-8") as f:
+            json.dump(geometria, f, ensure_ascii=False)
+    with open(destino / ARQUIVO_INDICE, "w", encoding="utf-8") as f:
+        json.dump(indice, f, ensure_ascii=False, indent=1)
+    fora = sum(nome is None for nome in municipio_ponto.values())
+    return indice, fora
+
+
+def _anexar(caminho, linhas):
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    novo = not caminho.exists()
+    linhas.to_csv(caminho, sep=";", index=False, header=novo, mode="w" if novo else "a")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--origem", type=Path, default=Path("data"))
+    parser.add_argument("--destino", type=Path, default=Path("data") / "municipios")
+    parser.add_argument("--camada", type=Path, required=True)
+    parser.add_argument("--campo", default="NM_MUN")
+    args = parser.parse_args(argv)
+
+    if any(args.destino.glob("*/n_vacinas_escola.csv")):
+        parser.error(f"{args.destino} já tem partições; use uma pasta vazia")
+    indice, fora = particionar(args.origem, args.destino, args.camada, args.campo)
+    print(f"{len(indice)} municípios em {args.destino}")
+    if fora:
+        print(f"{fora} pontos fora da camada ficaram sem partição")
+
+
+if __name__ == "__main__":
+    main()
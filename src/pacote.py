@@ -0,0 +1,124 @@
+import gzip
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from src.cubo import DIMENSOES, DIMENSOES_ALUNOS
+
+# colunas numéricas da folha do cubo enviadas ao navegador
+MEDIDAS_PACOTE = {
+    "n_vacinas": "int32",
+    "idade_soma": "float64",
+    "idade_contagem": "int32",
+}
+
+
+def _tipo_codigo(n_valores):
+    return "int16" if n_valores < np.iinfo("int16").max else "int32"
+
+
+def _valor_json(valor):
+    if pd.isna(valor):
+        return None
+    return valor.item() if isinstance(valor, np.generic) else valor
+
+
+def _lista_json(valores):
+    return [_valor_json(valor) for valor in valores]
+
+
+class PacoteCliente:
+    """Folha do cubo em formato colunar binário para o modo clientside.
+
+    O corpo é a concatenação de arrays tipados (códigos das cinco dimensões e
+    as medidas), comprimida com gzip uma única vez e servida com
+    ``Content-Encoding: gzip``; o navegador recebe o ``ArrayBuffer`` já
+    descomprimido. Os dicionários de valores, as coordenadas das unidades e
+    as contagens de alunos distintos e os rótulos dos dropdowns vão no
+    ``metadados``, em JSON.
+    """
+
+    def __init__(self, cubo, rotulos):
+        folha = cubo.cuboides[DIMENSOES]
+        colunas = {}
+        self.dicionarios = {}
+        for dim in DIMENSOES:
+            valores = folha.index.get_level_values(dim)
+            # dicionário na mesma ordem das opções dos dropdowns
+            dicionario = sorted(valores.dropna().unique())
+            self.dicionarios[dim] = dicionario
+            codigos = pd.Index(dicionario).get_indexer(valores)
+            colunas[dim] = codigos.astype(_tipo_codigo(len(dicionario)))
+        for medida, tipo in MEDIDAS_PACOTE.items():
+            colunas[medida] = folha[medida].to_numpy().astype(tipo)
+
+        partes = []
+        self.colunas = {}
+        deslocamento = 0
+        for nome, array in colunas.items():
+            # alinhamento de 8 bytes exigido pelos TypedArray do JavaScript
+            preenchimento = -deslocamento % 8
+            partes.append(b"\0" * preenchimento)
+            deslocamento += preenchimento
+            self.colunas[nome] = {
+                "tipo": str(array.dtype),
+                "deslocamento": deslocamento,
+            }
+            partes.append(array.tobytes())
+            deslocamento += array.nbytes
+        corpo = b"".join(partes)
+
+        self.n_linhas = len(folha)
+        self.conteudo = gzip.compress(corpo, mtime=0)
+        self.versao = hashlib.sha1(corpo).hexdigest()[:12]
+        self.nome_arquivo = f"pacote.{self.versao}.bin"
+
+        escolas = pd.Index(self.dicionarios["nome_unidade"])
+        unidades = cubo.unidades.reindex(escolas)
+        self.unidades = {
+            "latitude": _lista_json(unidades["latitude"]),
+            "longitude": _lista_json(unidades["longitude"]),
+        }
+        self.alunos = self._alunos_distintos(cubo)
+        # rótulos dos dropdowns na ordem dos dicionários
+        self.rotulos = {
+            dim: [rotulos[dim][valor] for valor in self.dicionarios[dim]]
+            for dim in rotulos
+        }
+
+    def _alunos_distintos(self, cubo):
+        # chave "escola|tipo" com os códigos do pacote; -1 representa "Todas"
+        codigos = {
+            dim: {valor: i for i, valor in enumerate(self.dicionarios[dim])}
+            for dim in DIMENSOES_ALUNOS
+        }
+        alunos = {"-1|-1": int(cubo.alunos_distintos[()])}
+        for dims, contagens in cubo.alunos_distintos.items():
+            if not dims:
+                continue
+            for chave, n in contagens.items():
+                chave = chave if isinstance(chave, tuple) else (chave,)
+                valores = dict(zip(dims, chave))
+                escola = codigos["nome_unidade"].get(valores.get("nome_unidade"), -1)
+                tipo = codigos["tipo_unidade"].get(valores.get("tipo_unidade"), -1)
+                # unidades sem vacinas no cubo não aparecem nos dropdowns
+                if ("nome_unidade" in valores and escola < 0) or (
+                    "tipo_unidade" in valores and tipo < 0
+                ):
+                    continue
+                alunos[f"{escola}|{tipo}"] = int(n)
+        return alunos
+
+    def metadados(self, url):
+        return {
+            "url": url,
+            "n_linhas": self.n_linhas,
+            "colunas": self.colunas,
+            "dicionarios": {
+                dim: _lista_json(valores) for dim, valores in self.dicionarios.items()
+            },
+            "rotulos": self.rotulos,
+            "unidades": self.unidades,
+            "alunos": self.alunos,
+        }
@@ -0,0 +1,157 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# coluna → rótulo na tabela; a ordem é a das colunas exibidas
+COLUNAS_RANKING = {
+    "nome_unidade": "Escola",
+    "n_vacinas": "Vacinas aplicadas",
+    "n_alunos": "Total de alunos",
+    "media_idade": "Média de idade",
+    "vacinas_por_aluno": "Vacinas por aluno",
+}
+
+# partes de filter_query do DataTable: {coluna} operador valor
+_PARTE_FILTRO = re.compile(
+    r"^\{(?P<coluna>[^}]+)\}\s+(?P<operador>\S+)\s+(?P<valor>.+)$", re.DOTALL
+)
+_COMPARACOES = {
+    "=": np.equal,
+    "eq": np.equal,
+    "!=": np.not_equal,
+    "ne": np.not_equal,
+    "<": np.less,
+    "lt": np.less,
+    "<=": np.less_equal,
+    "le": np.less_equal,
+    ">": np.greater,
+    "gt": np.greater,
+    ">=": np.greater_equal,
+    "ge": np.greater_equal,
+}
+_CONTEM = {"contains", "icontains", "scontains"}
+
+
+def _valor_filtro(texto):
+    texto = texto.strip()
+    if len(texto) >= 2 and texto[0] == texto[-1] and texto[0] in "\"'`":
+        texto = texto[1:-1]
+    return texto
+
+
+class RankingEscolas:
+    """Tabela por escola de um estado dos filtros, pronta para paginar.
+
+    Os agregados por escola saem do cubo uma vez; as ordens de cada coluna
+    (argsort) são calculadas na primeira vez que alguém ordena por ela e
+    reaproveitadas. Uma página é só a seleção das posições ordenadas que
+    passam no filtro de texto, então só as linhas visíveis viram registros.
+    """
+
+    def __init__(self, cubo, filtros):
+        medidas = cubo.medidas_por_escola(filtros)
+        # média de idade considera todos os anos, como no card
+        idade = cubo.medidas_por_escola(filtros, ignorar=("data_vacinacao_ano",))
+        idade = idade.reindex(medidas.index)
+        n_alunos = np.array(
+            [
+                cubo.n_alunos(escola, filtros["tipo_unidade"])
+                for escola in medidas.index
+            ],
+            dtype="int64",
+        )
+        n_vacinas = medidas["n_vacinas"].to_numpy(dtype="int64")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            media_idade = (
+                idade["idade_soma"].to_numpy(dtype="float64")
+                / idade["idade_contagem"].to_numpy(dtype="float64")
+            )
+            vacinas_por_aluno = np.where(n_alunos > 0, n_vacinas / n_alunos, np.nan)
+        self.colunas = {
+            "nome_unidade": np.asarray(medidas.index, dtype=object),
+            "n_vacinas": n_vacinas,
+            "n_alunos": n_alunos,
+            "media_idade": np.round(media_idade, 2),
+            "vacinas_por_aluno": np.round(vacinas_por_aluno, 2),
+        }
+        self._nomes = pd.Series(self.colunas["nome_unidade"], dtype="string")
+        self._nomes_minusculos = self._nomes.str.lower()
+        self._ordens = {}
+
+    def __len__(self):
+        return len(self.colunas["nome_unidade"])
+
+    def ordem(self, coluna):
+        # posições em ordem crescente da coluna (NaN no fim), memoizadas
+        if coluna not in self._ordens:
+            self._ordens[coluna] = np.argsort(self.colunas[coluna], kind="stable")
+        return self._ordens[coluna]
+
+    def _mascara(self, filter_query):
+        mascara = np.ones(len(self), dtype=bool)
+        for parte in filter_query.split(" && "):
+            casamento = _PARTE_FILTRO.match(parte.strip())
+            if casamento is None or casamento["coluna"] not in self.colunas:
+                continue
+            coluna, operador = casamento["coluna"], casamento["operador"]
+            valor = _valor_filtro(casamento["valor"])
+            if coluna == "nome_unidade":
+                # texto: busca por trecho, sem diferenciar maiúsculas exceto
+                # em scontains
+                if operador == "scontains":
+                    nomes = self._nomes
+                else:
+                    nomes, valor = self._nomes_minusculos, valor.lower()
+                if operador in _CONTEM:
+                    encontrados = nomes.str.contains(valor, regex=False)
+                elif operador in ("=", "eq"):
+                    encontrados = nomes == valor
+                else:
+                    continue
+                mascara &= encontrados.to_numpy(dtype=bool, na_value=False)
+            elif operador in _COMPARACOES:
+                try:
+                    numero = float(valor)
+                except ValueError:
+                    mascara[:] = False
+                    break
+                mascara &= _COMPARACOES[operador](self.colunas[coluna], numero)
+        return mascara
+
+    def pagina(self, pagina, tamanho, sort_by=None, filter_query=""):
+        """Registros, número de páginas e página exibida, após ordem e filtro.
+
+        A página pedida é limitada à última existente; quem chama devolve a
+        exibida à tabela para o paginador mostrar a mesma.
+        """
+        if sort_by:
+            coluna = sort_by[0]["column_id"]
+            posicoes = self.ordem(coluna)
+            if sort_by[0]["direction"] == "desc":
+                valores = self.colunas[coluna][posicoes]
+                if valores.dtype.kind == "f":
+                    # NaN continua no fim também na ordem decrescente
+                    validos = ~np.isnan(valores)
+                    posicoes = np.concatenate(
+                        [posicoes[validos][::-1], posicoes[~validos]]
+                    )
+                else:
+                    posicoes = posicoes[::-1]
+        else:
+            posicoes = np.arange(len(self))
+        if filter_query:
+            posicoes = posicoes[self._mascara(filter_query)[posicoes]]
+        n_paginas = max(1, -(-len(posicoes) // tamanho))
+        pagina = min(pagina or 0, n_paginas - 1)
+        visiveis = posicoes[pagina * tamanho : (pagina + 1) * tamanho]
+        linhas = zip(
+            *(
+                # NaN (sem alunos ou sem idade) vira célula vazia
+                [None if v != v else v for v in valores[visiveis].tolist()]
+                for valores in self.colunas.values()
+            )
+        )
+        registros = [dict(zip(self.colunas, linha)) for linha in linhas]
+        return registros, n_paginas, pagina
+
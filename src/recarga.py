@@ -0,0 +1,74 @@
+import logging
+import threading
+
+from src.dados import assinatura_dados, carregar_base
+from src.incremental import PASTA_DELTAS, aplicar_deltas, assinatura_deltas
+
+logger = logging.getLogger(__name__)
+
+
+class DadosAtuais:
+    """Referência versionada para a ``BaseVacinacao`` em uso.
+
+    ``verificar()`` (chamado periodicamente pela thread de ``Municipios``)
+    observa ``data_path``; quando um novo snapshot (ou CSV) aparece e para de
+    mudar, a base nova é montada fora do caminho das requisições e trocada
+    numa única atribuição. Se só chegaram deltas novos (``data_path/deltas``),
+    eles são somados à base atual em vez de recarregar tudo. Cada requisição
+    chama ``obter()`` uma vez e trabalha sobre a mesma versão do início ao fim.
+    """
+
+    def __init__(self, data_path, preparar=None, **opcoes):
+        self.data_path = data_path
+        # repassadas a ``carregar_base`` em toda (re)carga
+        self.opcoes = opcoes
+        # derivados que dependem da base (ex.: pacote do modo clientside)
+        self.preparar = preparar or (lambda base: base)
+        self._assinatura = self._estado()
+        self._base = self.preparar(self._carregar(self._assinatura[1]))
+        self.anterior = None
+        self._pendente = None
+        self._lock = threading.Lock()
+
+    def obter(self):
+        return self._base
+
+    def _estado(self):
+        return assinatura_dados(self.data_path), assinatura_deltas(self.data_path)
+
+    def _caminhos(self, deltas):
+        return [self.data_path / PASTA_DELTAS / nome for nome, *_ in deltas]
+
+    def _carregar(self, deltas):
+        # base completa mais os deltas ainda não compactados no snapshot
+        base = carregar_base(self.data_path, **self.opcoes)
+        return aplicar_deltas(base, self._caminhos(deltas))
+
+    def verificar(self):
+        assinatura = self._estado()
+        if assinatura == self._assinatura:
+            self._pendente = None
+            return False
+        # só recarrega depois de duas leituras iguais: arquivo ainda sendo copiado
+        if assinatura != self._pendente:
+            self._pendente = assinatura
+            return False
+        with self._lock:
+            (arquivos, deltas), (arquivos_atuais, deltas_atuais) = (
+                assinatura,
+                self._assinatura,
+            )
+            if (
+                arquivos == arquivos_atuais
+                and deltas[: len(deltas_atuais)] == deltas_atuais
+            ):
+                # só deltas novos: somados à base em uso, sem reler o histórico
+                novos = self._caminhos(deltas[len(deltas_atuais) :])
+                nova = self.preparar(aplicar_deltas(self._base, novos))
+            else:
+                nova = self.preparar(self._carregar(deltas))
+            self.anterior, self._base = self._base, nova
+            self._assinatura = assinatura
+            self._pendente = None
+        logger.info("dados recarregados: versão %s", nova.versao)
+        return True
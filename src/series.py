@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from src.cubo import DIMENSOES, TODAS
+
+ANO = "data_vacinacao_ano"
+
+
+class SeriesAnuais:
+    """Séries de ``n_vacinas`` por ano, em matrizes contíguas.
+
+    Para cada cuboide que contém o ano, as demais dimensões viram as linhas
+    (índice ordenado) e os anos viram as colunas de uma matriz densa, com zero
+    nos anos sem aplicações. Uma série ou comparação é só a seleção das linhas
+    que casam com os filtros, sem groupby na hora da requisição.
+    """
+
+    def __init__(self, cubo, anos):
+        self.anos = list(anos)
+        self.matrizes = {}
+        for dims, tabela in cubo.cuboides.items():
+            if ANO not in dims:
+                continue
+            linhas = tuple(dim for dim in dims if dim != ANO)
+            if not linhas:
+                serie = tabela["n_vacinas"].set_axis(tabela.index.get_level_values(ANO))
+                matriz = serie.reindex(self.anos, fill_value=0).to_numpy(dtype="int64")
+                self.matrizes[linhas] = (None, matriz[None, :])
+                continue
+            largura = (
+                tabela["n_vacinas"]
+                .unstack(ANO, fill_value=0)
+                .reindex(columns=self.anos, fill_value=0)
+                .sort_index()
+            )
+            chaves = largura.index
+            if not isinstance(chaves, pd.MultiIndex):
+                chaves = pd.MultiIndex.from_arrays([chaves], names=list(linhas))
+            matriz = np.ascontiguousarray(largura.to_numpy(dtype="int64"))
+            self.matrizes[linhas] = (chaves, matriz)
+
+    def series(self, filtros, por=None):
+        """Séries por ano dos filtros (o filtro de ano é ignorado).
+
+        Devolve ``(valores, matriz)``: sem ``por``, uma única linha com o
+        total; com ``por``, uma linha por valor dessa dimensão.
+        """
+        fixados = {
+            dim: valor
+            for dim, valor in filtros.items()
+            if valor != TODAS and dim != ANO
+        }
+        linhas = tuple(
+            dim for dim in DIMENSOES if dim in fixados or (dim == por and dim != ANO)
+        )
+        chaves, matriz = self.matrizes[linhas]
+        if chaves is None:
+            return [TODAS], matriz
+        chave = tuple(fixados.get(dim, slice(None)) for dim in linhas)
+        try:
+            posicoes = chaves.get_locs(chave)
+        except KeyError:
+            return [], matriz[:0]
+        if por is None:
+            return [TODAS], matriz[posicoes].sum(axis=0, keepdims=True)
+        valores = chaves[posicoes].get_level_values(por).tolist()
+        return valores, matriz[posicoes]
@@ -1,3 +1,31 @@
-def get_options_dropdown(table, column):
-    sorted_values = sorted(table[column].dropna().unique())
-    return [{"label": x, "value": x} for x in sorted_values]
\ No newline at end of file
+import base64
+
+import numpy as np
+
+
+def get_options_dropdown(values, format_label=None, include_all=False):
+    options = [{"label": "Todas", "value": "Todas"}] if include_all else []
+    if format_label is None:
+        return options + [{"label": x, "value": x} for x in values]
+    return options + [{"label": format_label(x), "value": x} for x in values]
+
+
+def formatar_label(label):
+    preposicoes = {
+        "em", "de", "da", "do", "dos", "das", "a", "e", "para", "por", "com", "sem", "sob", "sobre", "às", "ao", "aos", "as", "no", "na", "nos", "nas"
+    }
+    palavras = label.lower().split()
+    resultado = []
+    for i, palavra in enumerate(palavras):
+        if i == 0 or palavra not in preposicoes:
+            resultado.append(palavra.capitalize())
+        else:
+            resultado.append(palavra)
+    return " ".join(resultado)
+
+
+def array_tipado(valores, dtype="f8"):
+    # array tipado do plotly.js ({dtype, bdata} em base64): menor que a lista em
+    # JSON e decodificado direto para Float64Array/Int32Array no navegador
+    array = np.ascontiguousarray(valores, dtype=np.dtype(dtype).newbyteorder("<"))
+    return {"dtype": dtype, "bdata": base64.b64encode(array.tobytes()).decode("ascii")}
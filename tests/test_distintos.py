@@ -0,0 +1,21 @@
+import pandas as pd
+
+from benchmarks.gerador import gerar_extratos
+from src.dados import carregar_alunos
+from src.distintos import PRECISAO_HLL, ConjuntosAlunos
+
+
+def test_hll_esparso_ocupa_o_mesmo_que_os_arrays_exatos(tmp_path):
+    gerar_extratos(tmp_path, linhas=3000, n_escolas=20, semente=1)
+    n_alunos = carregar_alunos(tmp_path / "n_alunos.csv")
+    exato = ConjuntosAlunos(n_alunos)
+    aproximado = ConjuntosAlunos(n_alunos, aproximado=True)
+    # unidades pequenas: só os registradores ocupados, não 2**14 bytes cada
+    bytes_exatos = sum(conjunto.nbytes for conjunto in exato.conjuntos)
+    bytes_hll = sum(conjunto.nbytes for conjunto in aproximado.conjuntos)
+    assert bytes_hll <= bytes_exatos
+    assert bytes_hll < len(aproximado.folhas) << PRECISAO_HLL
+    for dims in [(), ("tipo_unidade",), ("nome_unidade",)]:
+        contagens = pd.Series(aproximado.contagens(dims))
+        esperadas = pd.Series(exato.contagens(dims))
+        assert ((contagens - esperadas).abs() <= 0.03 * esperadas + 2).all()
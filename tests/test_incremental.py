@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.gerador import gerar_extratos
+from src.dados import carregar_base
+from src.etl import compactar
+from src.incremental import (
+    PASTA_ALUNOS,
+    PASTA_DELTAS,
+    aplicar_deltas,
+    listar_deltas,
+)
+
+NOVOS_RAS = [1_000_000_001, 1_000_000_002, 5]
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    data_path = tmp_path / "data"
+    gerar_extratos(data_path, linhas=3000, n_escolas=20, semente=1)
+    vacinas = pd.read_csv(data_path / "n_vacinas_escola.csv", sep=";")
+    vacinas = vacinas[vacinas["data_vacinacao_ano"] >= 2020]
+    novas = vacinas.head(len(NOVOS_RAS))
+    estorno = vacinas.tail(1).assign(n_vacinas=lambda t: -t["n_vacinas"])
+    (data_path / PASTA_DELTAS / PASTA_ALUNOS).mkdir(parents=True)
+    pd.concat([novas, estorno]).to_csv(
+        data_path / PASTA_DELTAS / "2026-10-17.csv", sep=";", index=False
+    )
+    # alunos das aplicações novas; um RA em branco faz a coluna virar float64
+    alunos = novas[["tipo_unidade", "nome_unidade"]].assign(ra=NOVOS_RAS)
+    alunos = pd.concat([alunos, alunos.tail(1).assign(ra=np.nan)])
+    alunos.to_csv(
+        data_path / PASTA_DELTAS / PASTA_ALUNOS / "2026-10-17.csv",
+        sep=";",
+        index=False,
+    )
+    return data_path
+
+
+def _comparar(incremental, completa):
+    for dims, cuboide in completa.cubo.cuboides.items():
+        pd.testing.assert_frame_equal(
+            incremental.cubo.cuboides[dims].sort_index(),
+            cuboide.sort_index(),
+            check_dtype=False,
+        )
+    assert incremental.cubo.alunos_distintos == completa.cubo.alunos_distintos
+    assert incremental.anos == completa.anos
+    assert incremental.rotulos == completa.rotulos
+
+
+@pytest.mark.parametrize("aproximado", [False, True])
+def test_deltas_incrementais_igualam_reconstrucao(data_path, aproximado):
+    base = carregar_base(data_path, alunos_aproximado=aproximado)
+    incremental = aplicar_deltas(base, listar_deltas(data_path))
+    compactar(data_path)
+    completa = carregar_base(data_path, alunos_aproximado=aproximado)
+    _comparar(incremental, completa)
+    if not aproximado:
+        # os RAs do delta são alunos novos, inclusive o que não cabe em int32
+        assert incremental.cubo.alunos_distintos[()] > base.cubo.alunos_distintos[()]
+
+
+def test_ra_em_texto_num_conjunto_numerico(data_path):
+    base = carregar_base(data_path)
+    alunos = data_path / PASTA_DELTAS / PASTA_ALUNOS / "2026-10-17.csv"
+    tabela = pd.read_csv(alunos, sep=";")
+    tabela["ra"] = tabela["ra"].astype(object)
+    tabela.loc[tabela.index[0], "ra"] = "RA-TEXTO"
+    tabela.to_csv(alunos, sep=";", index=False)
+    with pytest.raises(ValueError):
+        aplicar_deltas(base, listar_deltas(data_path))
+
+
+def test_alunos_do_delta_sem_ra(data_path):
+    alunos = data_path / PASTA_DELTAS / PASTA_ALUNOS / "2026-10-17.csv"
+    pd.read_csv(alunos, sep=";").drop(columns="ra").to_csv(
+        alunos, sep=";", index=False
+    )
+    with pytest.raises(ValueError, match="ra"):
+        aplicar_deltas(carregar_base(data_path), listar_deltas(data_path))
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.gerador import gerar_extratos
+from src.cubo import TODAS
+from src.dados import carregar_base
+
+
+@pytest.fixture
+def base(tmp_path):
+    gerar_extratos(tmp_path, linhas=3000, n_escolas=20, semente=1)
+    caminho = tmp_path / "n_vacinas_escola.csv"
+    vacinas = pd.read_csv(caminho, sep=";")
+    # extratos reais têm modalidade e tipo de unidade em branco
+    vacinas.loc[vacinas.index[::7], "modalidade"] = np.nan
+    vacinas.loc[vacinas.index[::11], "tipo_unidade"] = np.nan
+    vacinas.to_csv(caminho, sep=";", index=False)
+    return carregar_base(tmp_path)
+
+
+def test_valores_em_branco_nao_viram_opcao(base):
+    for dim in ("modalidade", "tipo_unidade"):
+        opcoes = base.indice.opcoes[dim]
+        assert opcoes and not any(pd.isna(opcao) for opcao in opcoes)
+        filtros = {"modalidade": TODAS, "tipo_unidade": TODAS}
+        assert base.indice.valores(dim, filtros) == opcoes
+
+
+def test_selecao_ignora_linhas_em_branco(base):
+    indice = base.indice
+    modalidade = indice.opcoes["modalidade"][0]
+    linhas = indice.selecao({"modalidade": modalidade})
+    codigo = indice.opcoes["modalidade"].index(modalidade)
+    assert len(linhas) == np.count_nonzero(indice.codigos["modalidade"] == codigo)
+    assert np.all(indice.codigos["modalidade"][linhas] == codigo)
+    # as linhas em branco existem, mas só entram quando o filtro é "Todas"
+    assert np.any(indice.codigos["modalidade"] < 0)